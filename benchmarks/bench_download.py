@@ -0,0 +1,272 @@
+"""End-to-end download benchmark against the local stand-in servers.
+
+    python -m benchmarks.bench_download --albums 4 --tracks 10 --size 4MB
+
+Runs search, artist and track list requests through a real InnerTube
+client, then the Scheduler, Downloader and Transcoder with the regular
+on_complete_callback, and prints machine-readable results as JSON.
+Without ffmpeg the streams are synthetic bytes and the transcode/tag
+step is replaced by a plain rename.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import ctube
+from ctube import transport
+from ctube.cassette import RecordedStream, RecordedStreamQuery
+from ctube.containers import Job, Song, Stage
+from ctube.download import Downloader
+from ctube.extractors import extract_artist_id, iter_albums
+from ctube.formats import OutputFormat
+from ctube.metrics import record_stage
+from ctube.scheduler import Scheduler
+from benchmarks.standin import ARTIST_NAME, StandInConfig, serve
+
+
+class BenchmarkDownloader(Downloader):
+    """Resolves stream manifests from the stand-in instead of YouTube."""
+
+    def __init__(self, *args: Any, base_url: str, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.base_url = base_url
+
+    def _resolve_streams(self, video_id: str) -> RecordedStreamQuery:
+        response = transport.get_session().get(f"{self.base_url}/player/{video_id}", timeout=self.timeout)
+        response.raise_for_status()
+        manifest = response.json()
+        return RecordedStreamQuery([
+            RecordedStream(
+                url=manifest["url"],
+                itag=0,
+                mime_type=f"audio/{manifest['subtype']}",
+                bitrate=manifest["bitrate"],
+                filesize=manifest["filesize"],
+                expiration=datetime.fromtimestamp(manifest["expiration"])
+            )
+        ])
+
+
+def rename_callback(song: Song) -> str:
+    """Stands for on_complete_callback when no encoder is available."""
+    with record_stage("transcode"):
+        output = f"{os.path.splitext(song.filepath)[0]}.{song.output_format.value}"
+        os.replace(song.filepath, output)
+    return output
+
+
+def find_encoder() -> Optional[str]:
+    return shutil.which("ffmpeg") or shutil.which("avconv")
+
+
+def make_audio(encoder: str, output_format: OutputFormat, size: int, bitrate: int) -> bytes:
+    """Encodes a sine tone lasting about size bytes at bitrate."""
+    codec = "libopus" if output_format.subtype == "webm" else "aac"
+    duration = max(size * 8 / bitrate, 1)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, f"template.{output_format.subtype}")
+        subprocess.run(
+            [
+                encoder, "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+                "-c:a", codec, "-b:a", str(bitrate), "-f", output_format.subtype, filepath
+            ],
+            check=True
+        )
+        with open(filepath, "rb") as file:
+            return file.read()
+
+
+def _percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    values = sorted(values)
+
+    def pick(percent: float) -> float:
+        return values[min(int(round(percent / 100 * (len(values) - 1))), len(values) - 1)]
+
+    return {"p50": pick(50), "p90": pick(90), "p99": pick(99), "max": values[-1]}
+
+
+def _peak_rss(who: int) -> int:
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS.
+    peak = resource.getrusage(who).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run(
+        config: StandInConfig,
+        output_format: OutputFormat = OutputFormat.MP3,
+        max_transfers: int = 8,
+        max_albums: int = 2,
+        transcode_workers: Optional[int] = None,
+        streaming: bool = False,
+        transcode: Optional[bool] = None
+) -> Dict[str, Any]:
+    from innertube.clients import InnerTube
+    import httpx
+    from ctube.callbacks import on_complete_callback
+
+    encoder = find_encoder()
+    transcode = encoder is not None if transcode is None else transcode
+    stream = None
+    if transcode:
+        if encoder is None:
+            raise RuntimeError("ffmpeg is required to benchmark the transcode step")
+        stream = make_audio(encoder, output_format, config.stream_size, config.bitrate)
+    config.subtype = output_format.subtype
+
+    # The stand-in runs in its own process: its CPU time and memory are
+    # not part of the measurements.
+    context = multiprocessing.get_context("spawn")
+    ports = context.Queue()
+    server = context.Process(target=serve, args=(config, stream, ports), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{ports.get(timeout=30)}"
+
+    output_path = tempfile.mkdtemp(prefix="ctube-bench-")
+    client = InnerTube("WEB_REMIX")
+    client.adaptor.session = httpx.Client(base_url=f"{base_url}/youtubei/v1/")
+    downloader = BenchmarkDownloader(
+        output_path=output_path,
+        on_complete_callback=on_complete_callback if transcode else rename_callback,
+        on_progress_callback=lambda song, filesize, received: None,
+        transcode_workers=transcode_workers,
+        streaming=streaming and transcode,
+        output_format=output_format,
+        client=client,
+        base_url=base_url
+    )
+    scheduler = Scheduler(
+        downloader,
+        on_album_complete_callback=lambda album, downloaded, total, error: None,
+        max_transfers=max_transfers,
+        max_albums=max_albums
+    )
+    try:
+        started = time.perf_counter()
+        artist_id = extract_artist_id(client.search(ARTIST_NAME))
+        albums = list(iter_albums(client, client.browse(f"MPAD{artist_id}")))
+        jobs = [
+            Job(
+                album=album,
+                artist=ARTIST_NAME,
+                image_data=transport.get_session().get(album.thumbnail_url).content
+            )
+            for album in albums
+        ]
+        discovery = time.perf_counter() - started
+
+        completions: List[float] = []
+        failures: Dict[str, int] = {}
+        for song, stage, error in scheduler.run(jobs):
+            if error:
+                name = error.split(":", 1)[0]
+                failures[name] = failures.get(name, 0) + 1
+            elif stage == Stage.TRANSCODE:
+                completions.append(time.perf_counter() - started)
+        wall_time = time.perf_counter() - started
+    finally:
+        downloader.close()
+        server.terminate()
+        shutil.rmtree(output_path, ignore_errors=True)
+
+    report = downloader.metrics.report()
+    track_latencies = [sum(track["stages"].values()) for track in report.pop("per_track")]
+    return {
+        "version": ctube.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            **vars(config),
+            "output_format": output_format.value,
+            "max_transfers": max_transfers,
+            "max_albums": max_albums,
+            "transcode_workers": downloader.transcoder.max_workers,
+            "streaming": streaming and transcode,
+            "transcode": transcode
+        },
+        "tracks": len(completions),
+        "failed": sum(failures.values()),
+        "failures": failures,
+        "wall_time": wall_time,
+        "discovery_time": discovery,
+        "throughput": {
+            "bytes_per_second": report["bytes"] / wall_time,
+            "tracks_per_second": len(completions) / wall_time
+        },
+        "latency": {
+            "track": _percentiles(track_latencies),
+            "completion": _percentiles(completions),
+            "stages": report["stages"]
+        },
+        "peak_rss": {
+            "main": _peak_rss(resource.RUSAGE_SELF),
+            "workers": _peak_rss(resource.RUSAGE_CHILDREN)
+        },
+        "metrics": report
+    }
+
+
+def _parse_size(value: str) -> int:
+    units = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "B": 1}
+    for unit, factor in units.items():
+        if value.upper().endswith(unit):
+            return int(float(value[:-len(unit)]) * factor)
+    return int(value)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_download")
+    parser.add_argument("--albums", type=int, default=4)
+    parser.add_argument("--tracks", type=int, default=10, help="tracks per album")
+    parser.add_argument("--size", type=_parse_size, default="4MB", help="stream size, e.g. 512KB")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--bandwidth", type=_parse_size, help="bytes per second per connection")
+    parser.add_argument(
+        "--format",
+        choices=[output_format.value for output_format in OutputFormat],
+        default=OutputFormat.MP3.value
+    )
+    parser.add_argument("--transfers", type=int, default=8)
+    parser.add_argument("--max-albums", type=int, default=2)
+    parser.add_argument("--transcode-workers", type=int)
+    parser.add_argument("--streaming", action="store_true")
+    parser.add_argument("--no-transcode", action="store_true", help="skip ffmpeg even if available")
+    parser.add_argument("-o", "--output", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(
+        StandInConfig(
+            albums=args.albums,
+            tracks=args.tracks,
+            stream_size=args.size,
+            latency=args.latency,
+            bandwidth=args.bandwidth
+        ),
+        output_format=OutputFormat(args.format),
+        max_transfers=args.transfers,
+        max_albums=args.max_albums,
+        transcode_workers=args.transcode_workers,
+        streaming=args.streaming,
+        transcode=False if args.no_transcode else None
+    )
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
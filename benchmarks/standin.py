@@ -0,0 +1,297 @@
+"""Local stand-in for the InnerTube API and the stream servers.
+
+Serves canned search/browse responses shaped like the ones parsed by
+ctube.extractors, stream manifests, cover arts and synthetic streams
+with a configurable size, latency and bandwidth.
+"""
+import re
+import json
+import time
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+ARTIST_NAME = "Stand-in Artist"
+ARTIST_ID = "UCstandin0000000000000000"
+COVER = b"\xff\xd8\xff\xe0" + bytes(1020)  # looks like a JPEG to taggers
+BLOCK_SIZE = 64 * 1024
+
+
+@dataclass
+class StandInConfig:
+    albums: int = 4
+    tracks: int = 10
+    stream_size: int = 4 * 1024 * 1024  # bytes, ignored with an audio template
+    bitrate: int = 128000  # advertised in the manifests, bits per second
+    subtype: str = "mp4"
+    latency: float = 0.0  # seconds before the first byte of every response
+    bandwidth: Optional[int] = None  # bytes per second, per connection
+    page_size: int = 10  # albums per browse page
+    track_page_size: int = 100  # tracks per browse page, like the VL pages
+
+
+def playlist_id(album: int) -> str:
+    return f"PLstandin{album:04d}"
+
+
+def video_id(album: int, track: int) -> str:
+    return f"v{album:04d}t{track:05d}"  # 11 characters, like real ids
+
+
+def _runs(text: str, **extra: Any) -> Dict:
+    return {"runs": [{"text": text, **extra}]}
+
+
+def search_response() -> Dict:
+    card = {
+        "musicCardShelfRenderer": {
+            "title": _runs(
+                ARTIST_NAME,
+                navigationEndpoint={"browseEndpoint": {"browseId": ARTIST_ID}}
+            )
+        }
+    }
+    return {
+        "contents": {
+            "tabbedSearchResultsRenderer": {
+                "tabs": [{
+                    "tabRenderer": {
+                        "content": {"sectionListRenderer": {"contents": [{}, card]}}
+                    }
+                }]
+            }
+        }
+    }
+
+
+def _album_item(base_url: str, album: int) -> Dict:
+    return {
+        "musicTwoRowItemRenderer": {
+            "title": _runs(f"Album {album}"),
+            "subtitle": {"runs": [{"text": "Album"}, {"text": " • "}, {"text": "2020"}]},
+            "thumbnailRenderer": {
+                "musicThumbnailRenderer": {
+                    "thumbnail": {"thumbnails": [{"url": f"{base_url}/cover/{album}"}]}
+                }
+            },
+            "menu": {
+                "menuRenderer": {
+                    "items": [{
+                        "menuNavigationItemRenderer": {
+                            "navigationEndpoint": {
+                                "watchPlaylistEndpoint": {"playlistId": playlist_id(album)}
+                            }
+                        }
+                    }]
+                }
+            }
+        }
+    }
+
+
+def _album_page(base_url: str, config: StandInConfig, page: int) -> List[Dict]:
+    start = page * config.page_size
+    stop = min(start + config.page_size, config.albums)
+    items = [_album_item(base_url, album) for album in range(start, stop)]
+    if stop < config.albums:
+        items.append({
+            "continuationItemRenderer": {
+                "continuationEndpoint": {"continuationCommand": {"token": f"albums:{page + 1}"}}
+            }
+        })
+    return items
+
+
+def artist_response(base_url: str, config: StandInConfig) -> Dict:
+    grid = {"gridRenderer": {"items": _album_page(base_url, config, 0)}}
+    return {
+        "header": {"musicHeaderRenderer": {"title": _runs(ARTIST_NAME)}},
+        "contents": {
+            "singleColumnBrowseResultsRenderer": {
+                "tabs": [{
+                    "tabRenderer": {"content": {"sectionListRenderer": {"contents": [grid]}}}
+                }]
+            }
+        }
+    }
+
+
+def continuation_response(base_url: str, config: StandInConfig, page: int) -> Dict:
+    return {
+        "onResponseReceivedActions": [{
+            "appendContinuationItemsAction": {
+                "continuationItems": _album_page(base_url, config, page)
+            }
+        }]
+    }
+
+
+def _track_page(config: StandInConfig, album: int, page: int) -> List[Dict]:
+    start = page * config.track_page_size
+    stop = min(start + config.track_page_size, config.tracks)
+    items: List[Dict] = [
+        {
+            "musicResponsiveListItemRenderer": {
+                "playlistItemData": {"videoId": video_id(album, track)},
+                "flexColumns": [{
+                    "musicResponsiveListItemFlexColumnRenderer": {"text": _runs(f"Track {track}")}
+                }],
+                "fixedColumns": [{
+                    "musicResponsiveListItemFixedColumnRenderer": {"text": _runs("3:30")}
+                }]
+            }
+        }
+        for track in range(start, stop)
+    ]
+    if stop < config.tracks:
+        items.append({
+            "continuationItemRenderer": {
+                "continuationEndpoint": {
+                    "continuationCommand": {"token": f"tracks:{album}:{page + 1}"}
+                }
+            }
+        })
+    return items
+
+
+def tracks_response(config: StandInConfig, album: int) -> Dict:
+    items = _track_page(config, album, 0)
+    return {
+        "contents": {
+            "singleColumnBrowseResultsRenderer": {
+                "tabs": [{
+                    "tabRenderer": {
+                        "content": {
+                            "sectionListRenderer": {
+                                "contents": [{"musicPlaylistShelfRenderer": {"contents": items}}]
+                            }
+                        }
+                    }
+                }]
+            }
+        }
+    }
+
+
+def tracks_continuation_response(config: StandInConfig, album: int, page: int) -> Dict:
+    return {
+        "onResponseReceivedActions": [{
+            "appendContinuationItemsAction": {
+                "continuationItems": _track_page(config, album, page)
+            }
+        }]
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StandInServer"
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real servers
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def _send(
+            self,
+            status: int,
+            body: bytes,
+            content_type: str,
+            headers: Optional[Dict[str, str]] = None
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self._write(body)
+
+    def _write(self, body: bytes) -> None:
+        bandwidth = self.server.config.bandwidth
+        started = time.perf_counter()
+        for start in range(0, len(body), BLOCK_SIZE):
+            self.wfile.write(body[start:start + BLOCK_SIZE])
+            if bandwidth:
+                ahead = (start + BLOCK_SIZE) / bandwidth - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+    def _send_json(self, data: Dict) -> None:
+        self._send(200, json.dumps({"responseContext": {}, **data}).encode(), "application/json")
+
+    def do_POST(self) -> None:
+        time.sleep(self.server.config.latency)
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        endpoint = urlparse(self.path).path.rstrip("/").rsplit("/", 1)[-1]
+        base_url, config = self.server.base_url, self.server.config
+        if endpoint == "search":
+            self._send_json(search_response())
+        elif endpoint == "browse" and body.get("continuation", "").startswith("tracks:"):
+            album, page = (int(part) for part in body["continuation"].split(":")[1:])
+            self._send_json(tracks_continuation_response(config, album, page))
+        elif endpoint == "browse" and "continuation" in body:
+            page = int(body["continuation"].split(":")[1])
+            self._send_json(continuation_response(base_url, config, page))
+        elif endpoint == "browse" and body.get("browseId", "").startswith("MPAD"):
+            self._send_json(artist_response(base_url, config))
+        elif endpoint == "browse" and body.get("browseId", "").startswith("VLPLstandin"):
+            self._send_json(tracks_response(config, int(body["browseId"][len("VLPLstandin"):])))
+        else:
+            self._send_json({"error": {"code": 404, "message": "Not found", "errors": []}})
+
+    def do_GET(self) -> None:
+        time.sleep(self.server.config.latency)
+        path = urlparse(self.path).path
+        if path.startswith("/player/"):
+            manifest = {
+                "url": f"{self.server.base_url}/stream/{path[len('/player/'):]}",
+                "filesize": len(self.server.stream),
+                "bitrate": self.server.config.bitrate,
+                "subtype": self.server.config.subtype,
+                "expiration": time.time() + 6 * 60 * 60
+            }
+            self._send(200, json.dumps(manifest).encode(), "application/json")
+        elif path.startswith("/cover/"):
+            self._send(200, COVER, "image/jpeg")
+        elif path.startswith("/stream/"):
+            start, end = self._get_range(len(self.server.stream))
+            self._send(
+                206,
+                self.server.stream[start:end + 1],
+                "application/octet-stream",
+                {"Content-Range": f"bytes {start}-{end}/{len(self.server.stream)}"}
+            )
+        else:
+            self._send(404, b"", "text/plain")
+
+    def _get_range(self, size: int) -> Tuple[int, int]:
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match is None:
+            return 0, size - 1
+        return int(match[1]), min(int(match[2] or size - 1), size - 1)
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: StandInConfig, stream: Optional[bytes] = None, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.config = config
+        # Every track serves the same bytes: an audio template when given,
+        # otherwise a pattern of the configured size.
+        self.stream = stream if stream is not None else (
+            bytes(range(256)) * (config.stream_size // 256 + 1)
+        )[:config.stream_size]
+        self.base_url = f"http://127.0.0.1:{self.server_port}"
+
+    def start(self) -> "StandInServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def serve(config: StandInConfig, stream: Optional[bytes], ports: Any) -> None:
+    """Target of the stand-in process: puts the port on ports, then serves."""
+    server = StandInServer(config, stream)
+    ports.put(server.server_port)
+    server.serve_forever()
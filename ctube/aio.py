@@ -0,0 +1,258 @@
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import (
+    Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+)
+from urllib.parse import urlparse
+import httpx
+from ctube import transfer
+from ctube.containers import Album, Song, Track
+from ctube.download import DOWNLOAD_ERRORS, Downloader, _format_error
+from ctube.errors import TransferInterrupted
+from ctube.limits import HostBackoff, TokenBucket
+from ctube.transport import DEFAULT_HEADERS
+
+
+async def _wait(delay: float) -> None:
+    if delay > 0:
+        await asyncio.sleep(delay)
+    if transfer.stopped():
+        raise TransferInterrupted("Transfer interrupted")
+
+
+async def iter_range(
+        client: httpx.AsyncClient,
+        url: str,
+        start: int,
+        end: int,
+        chunk_size: int,
+        timeout: Optional[int] = None,
+        max_retries: int = 0,
+        sizer: Optional[transfer.ChunkSizer] = None,
+        limiter: Optional[TokenBucket] = None,
+        backoff: Optional[HostBackoff] = None,
+        on_throttle: Optional[Callable[[float], None]] = None,
+        on_retry: Optional[Callable[[BaseException], None]] = None
+) -> AsyncGenerator[bytes, None]:
+    """Asynchronous transfer.iter_range, on an httpx.AsyncClient."""
+    policy = transfer.RangePolicy(
+        url,
+        end=end,
+        chunk_size=chunk_size,
+        max_retries=max_retries,
+        sizer=sizer,
+        limiter=limiter,
+        backoff=backoff,
+        on_throttle=on_throttle,
+        on_retry=on_retry
+    )
+    position = start
+    while position < end:
+        await _wait(0)
+        headers, delay = policy.next_range(position)
+        await _wait(delay)
+        while True:
+            await _wait(policy.attempt_delay())
+            try:
+                started = time.perf_counter()
+                async with client.stream("GET", url, headers=headers, timeout=timeout) as response:
+                    latency = time.perf_counter() - started
+                    response.raise_for_status()
+                    transfer.check_range(response, position)
+                    chunk = await response.aread()
+            except httpx.TransportError as err:
+                # Only connection level errors are retried.
+                policy.retry(err)
+            except httpx.HTTPStatusError as err:
+                policy.throttled(err, err.response)
+            else:
+                break
+
+        policy.received(chunk, position, latency=latency, elapsed=time.perf_counter() - started)
+        position += len(chunk)
+        yield chunk
+
+
+async def download(
+        client: httpx.AsyncClient,
+        url: str,
+        filepath: str,
+        filesize: int,
+        chunk_size: int,
+        on_progress: Callable[[int], None],
+        **options: Any
+) -> str:
+    """Asynchronous transfer.download, resumable through the same PartFile.
+       The file is written in the loop's default executor."""
+    loop = asyncio.get_running_loop()
+    part = transfer.PartFile(filepath, filesize)
+    try:
+        received = await loop.run_in_executor(None, part.open)
+        on_progress(received)
+        async for chunk in iter_range(
+                client, url, start=received, end=filesize, chunk_size=chunk_size, **options
+        ):
+            on_progress(await loop.run_in_executor(None, part.write, chunk))
+    finally:
+        await loop.run_in_executor(None, part.close)
+    return await loop.run_in_executor(None, part.finish)
+
+
+class AsyncDownloader(Downloader):
+    """Downloader whose transfers can run on an asyncio event loop.
+
+    adownload_album and adownload_track are the asynchronous versions of
+    download_album and download_track, which still work as in Downloader.
+    Range requests share one httpx.AsyncClient and at most max_concurrency
+    tracks are in flight, max_host_connections per host, without a thread
+    per download. The InnerTube
+    client and pytubefix are blocking, so track lists and stream manifests
+    are resolved in the loop's default executor. Streams are always saved
+    to a file before being transcoded: the streaming option is ignored.
+    """
+
+    def __init__(self, *args: Any, max_concurrency: int = 64, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.max_concurrency = max_concurrency
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_http(self) -> httpx.AsyncClient:
+        # Created on first use, inside the event loop that runs the downloads.
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                headers=DEFAULT_HEADERS,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._http
+
+    @asynccontextmanager
+    async def _acquire_host(self, url: str) -> AsyncIterator[None]:
+        max_connections = self.host_limiter.max_connections
+        if max_connections is None:
+            yield
+            return
+        host = urlparse(url).netloc
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(max_connections)
+        async with self._host_semaphores[host]:
+            yield
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aenter__(self) -> "AsyncDownloader":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.aclose()
+
+    async def adownload_album(
+            self,
+            album: Album,
+            artist: str,
+            image_data: bytes
+    ) -> AsyncGenerator[Tuple[Song, Optional[str]], None]:
+        """Yields (song, error) for every track, as soon as it is transcoded.
+           Tracks downloaded in a previous run are yielded first."""
+        loop = asyncio.get_running_loop()
+        # Disk and ledger lookups run in the default executor as well.
+        output_path = await loop.run_in_executor(None, self.get_album_path, album, artist)
+        tracks = await loop.run_in_executor(None, self.get_tracks, album)
+        pending: List[Track] = []
+        for track in tracks:
+            song = await loop.run_in_executor(
+                None,
+                self.get_completed_track,
+                track,
+                album,
+                artist,
+                image_data,
+                output_path
+            )
+            if song is not None:
+                yield song, None
+            else:
+                pending.append(track)
+
+        tasks = [
+            asyncio.ensure_future(
+                self.adownload_track(
+                    track=track,
+                    album=album,
+                    artist=artist,
+                    image_data=image_data,
+                    output_path=output_path,
+                    upcoming=pending
+                )
+            )
+            for track in pending
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def adownload_track(
+            self,
+            track: Track,
+            album: Album,
+            artist: str,
+            image_data: bytes,
+            output_path: str,
+            upcoming: Sequence[Track] = ()
+    ) -> Tuple[Song, Optional[str]]:
+        loop = asyncio.get_running_loop()
+        http = self._get_http()
+        assert self._semaphore is not None
+        song = self._make_song(track, album=album, artist=artist, image_data=image_data)
+        async with self._semaphore:
+            self._prefetch_upcoming(track, upcoming)
+            try:
+                song.outputs = self.get_outputs(
+                    track.title, album=album, artist=artist, output_path=output_path
+                )
+                with self.metrics.measure("manifest", song):
+                    stream = await loop.run_in_executor(None, self._get_stream, song)
+                filepath = self._get_source_path(song, output_path)
+                if self.skip_existing and await loop.run_in_executor(None, os.path.exists, filepath):
+                    song.filepath = filepath
+                else:
+                    async with self._acquire_host(stream.url):
+                        with self.metrics.measure("transfer", song):
+                            song.filepath = await download(
+                                http,
+                                stream.url,
+                                filepath=filepath,
+                                filesize=stream.filesize,
+                                chunk_size=self.chunk_size,
+                                on_progress=self._get_progress_callback(song, stream.filesize),
+                                **self._transfer_options(song)
+                            )
+            except DOWNLOAD_ERRORS + (httpx.HTTPError,) as err:
+                self.metrics.set_error(song, err)
+                return song, _format_error(err)
+
+        # Transcoder.submit blocks while the encoders are busy.
+        with self.metrics.measure("transcode_wait", song):
+            future = await loop.run_in_executor(None, self.transcoder.submit, song)
+        future.add_done_callback(lambda _: self._on_transcode_done(song, future))
+        try:
+            await asyncio.wrap_future(future)
+        except Exception:
+            pass  # reported by get_transcode_result
+        _, _, error = self.get_transcode_result(song, future)
+        return song, error
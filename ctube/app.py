@@ -1,15 +1,18 @@
+import os
 import ctube
 import sys
-from requests.exceptions import RequestException
-from typing import List, Optional, Tuple
-from urllib import request
-from urllib.error import URLError
-from innertube.clients import InnerTube
-from ctube.update import get_latest_version
-from ctube.download import Downloader
+import tempfile
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+from ctube.update import VersionCheck
+from ctube.formats import OutputFormat, OutputProfile
+from ctube.covers import CoverCache
+from ctube.cache import DEFAULT_TTLS, CachedClient, ResponseCache
+from ctube.cassette import Cassette
+from ctube.paths import CACHE
+from ctube import transfer, transport
 from ctube.errors import InvalidIndexSyntax
 from ctube.terminal import Prompt
-from ctube.containers import Album
+from ctube.containers import Album, Job, Stage
 from ctube.colors import Color
 from ctube.cmds import Command
 from ctube.helpers import (
@@ -19,13 +22,12 @@ from ctube.helpers import (
     connected_to_internet
 )
 from ctube.parser import parse_user_input
-from ctube.callbacks import (
-    on_progress_callback, 
-    on_complete_callback
-)
+from ctube.callbacks import on_complete_callback
+from ctube.progress import ProgressRenderer
+from ctube.metrics import Metrics
 from ctube.printers import (
     clear_screen,
-    print_albums_list,
+    print_album,
     print_albums_dict,
     print_header, 
     print_help, 
@@ -33,9 +35,14 @@ from ctube.printers import (
 )
 from ctube.extractors import (
     extract_artist_id, 
-    extract_albums
+    extract_artist_name,
+    iter_albums
 )
 
+if TYPE_CHECKING:
+    from ctube.download import Downloader
+    from ctube.scheduler import Scheduler
+
 
 class App:
     def __init__(
@@ -43,37 +50,167 @@ class App:
             output_path: str,
             skip_existing: bool = True,
             timeout: int = 5,
-            max_retries: int = 3
+            max_retries: int = 3,
+            max_workers: int = 4,
+            max_transfers: int = 8,
+            max_host_connections: Optional[int] = None,
+            max_albums: int = 2,
+            transcode_workers: Optional[int] = None,
+            max_pending_transcodes: Optional[int] = None,
+            streaming: bool = False,
+            output_format: OutputFormat = OutputFormat.MP3,
+            profiles: Optional[Sequence[OutputProfile]] = None,
+            max_bitrate: Optional[int] = None,
+            cover_cache_size: int = 64 * 1024 * 1024,
+            response_cache_ttls: Optional[Dict[str, int]] = None,
+            prefetch: int = 2,
+            pool_size: int = 16,
+            min_chunk_size: int = transfer.MIN_CHUNK_SIZE,
+            max_chunk_size: int = transfer.MAX_CHUNK_SIZE,
+            max_rate: Optional[int] = None,
+            throttle_retries: int = 5,
+            update_check_interval: int = 24 * 60 * 60,
+            progress: Optional[ProgressRenderer] = None,
+            metrics_path: Optional[str] = None,
+            prometheus_path: Optional[str] = None,
+            record_path: Optional[str] = None,
+            replay_path: Optional[str] = None,
+            replay_time_scale: float = 1.0
     ):
-        self.client = InnerTube("WEB_REMIX")
+        self.cassette: Optional[Cassette] = None
+        self._cassette_dir: Optional[tempfile.TemporaryDirectory] = None
+        if record_path is not None:
+            self.cassette = Cassette(record_path, mode="record")
+        elif replay_path is not None:
+            self.cassette = Cassette(replay_path, mode="replay", time_scale=replay_time_scale)
+        if self.cassette is not None:
+            # Covers are fetched again, so that they are part of the cassette.
+            self._cassette_dir = tempfile.TemporaryDirectory(prefix="ctube-")
+        transport.configure(pool_size=pool_size, cassette=self.cassette)
         self.prompt = Prompt()
-        self.downloader = Downloader(
+        self.progress = progress if progress is not None else ProgressRenderer()
+        self.covers = CoverCache(
+            path=(
+                self._cassette_dir.name if self._cassette_dir is not None
+                else os.path.join(CACHE, "covers")
+            ),
+            max_size=cover_cache_size,
+            timeout=timeout
+        )
+        self.version_check = VersionCheck(
+            pkg_name="ctube",
+            cache_path=os.path.join(CACHE, "version.json"),
+            max_age=update_check_interval,
+            timeout=timeout
+        )
+        self._version_announced = False
+        self._closed = False
+        self.response_cache_ttls = response_cache_ttls
+        self.metrics = Metrics()
+        self.metrics_path = metrics_path
+        self.prometheus_path = prometheus_path
+        self.max_transfers = max_transfers
+        self.max_albums = max_albums
+        self.downloader_options: Dict[str, Any] = dict(
             output_path=output_path, 
             skip_existing=skip_existing,
             on_complete_callback=on_complete_callback,
-            on_progress_callback=on_progress_callback,
+            on_progress_callback=self.progress.update,
             timeout=timeout,
-            max_retries=max_retries
+            max_retries=max_retries,
+            max_workers=max_workers,
+            max_host_connections=max_host_connections,
+            transcode_workers=transcode_workers,
+            max_pending_transcodes=max_pending_transcodes,
+            streaming=streaming,
+            output_format=output_format,
+            profiles=profiles,
+            max_bitrate=max_bitrate,
+            prefetch=prefetch,
+            min_chunk_size=min_chunk_size,
+            max_chunk_size=max_chunk_size,
+            max_rate=max_rate,
+            throttle_retries=throttle_retries,
+            on_throttle_callback=self.progress.throttled,
+            metrics=self.metrics,
+            cassette=self.cassette
         )
 
+        # The InnerTube client and the download stack pull in heavy
+        # dependencies, they are built when a command first needs them.
+        self._client: Optional[CachedClient] = None
+        self._downloader: Optional["Downloader"] = None
+        self._scheduler: Optional["Scheduler"] = None
+
         # last search
         self._albums: Optional[List[Album]] = None
         self._artist_name: Optional[str] = None
+        self._last_query: Optional[Tuple[Command, str]] = None
+
+    @property
+    def client(self) -> CachedClient:
+        if self._client is None and self.cassette is not None:
+            # Every call reaches the cassette: the cache is not persisted.
+            client = None
+            if self.cassette.recording:
+                from innertube.clients import InnerTube
+                client = InnerTube("WEB_REMIX")
+            self._client = CachedClient(
+                client=self.cassette.wrap_client(client),
+                cache=ResponseCache(),
+                ttls=self.response_cache_ttls
+            )
+        elif self._client is None:
+            from innertube.clients import InnerTube
+            ttls = {**DEFAULT_TTLS, **(self.response_cache_ttls or {})}
+            self._client = CachedClient(
+                client=InnerTube("WEB_REMIX"),
+                # Responses older than the longest TTL are never served.
+                cache=ResponseCache(
+                    path=os.path.join(CACHE, "responses"), max_age=max(ttls.values())
+                ),
+                ttls=ttls
+            )
+        return self._client
+
+    @property
+    def downloader(self) -> "Downloader":
+        if self._downloader is None:
+            from ctube.download import Downloader
+            self._downloader = Downloader(**self.downloader_options, client=self.client)
+        return self._downloader
+
+    @property
+    def scheduler(self) -> "Scheduler":
+        if self._scheduler is None:
+            from ctube.scheduler import Scheduler
+            self._scheduler = Scheduler(
+                downloader=self.downloader,
+                on_album_complete_callback=self._on_album_complete,
+                max_transfers=self.max_transfers,
+                max_albums=self.max_albums
+            )
+        return self._scheduler
+
+    def _print_version_status(self) -> None:
+        if self._version_announced or not self.version_check.done:
+            return
+        self._version_announced = True
+        latest_version = self.version_check.latest_version
+        if latest_version is None:
+            return
+        if latest_version > ctube.__version__:
+            print(f"=> New version available: {latest_version}")
+            print(f"=> Close and run 'pip install -U ctube' to update.")
+        else:
+            print("=> ctube is up to date")
 
     def main_loop(self) -> None:
         clear_screen()
         print_header()
-        try:
-            latest_version = get_latest_version("ctube")
-        except RequestException:
-            pass
-        else:
-            if latest_version > ctube.__version__:
-                print(f"=> New version available: {latest_version}")
-                print(f"=> Close and run 'pip install -U ctube' to update.")
-            else:
-                print("=> ctube is up to date")
+        self.version_check.start()
         while True:
+            self._print_version_status()
             user_input = self.prompt.get_input().strip()
 
             if not user_input: 
@@ -88,51 +225,73 @@ class App:
             else:
                 match cmd:
                     case Command.EXIT:
-                        App._exit()
+                        self._exit()
                     case Command.CLEAR:
                         clear_screen()
                     case Command.HELP:
                         print_help()
                     case Command.SEARCH:
+                        self._last_query = (cmd, args)
                         self._search(args)
                     case Command.ID:
+                        self._last_query = (cmd, args)
                         self._id(args)
+                    case Command.REFRESH:
+                        self._refresh()
                     case Command.DOWNLOAD:
                         self._download(args)
                     case Command.FILTER:
                         self._filter(args)
 
     @handle_connection_errors
-    def _search(self, artist_name: str) -> None:
+    def _search(self, artist_name: str, refresh: bool = False) -> None:
         if not artist_name:
             write("Missing argument: artist name", Color.RED)
         else:
-            data = self.client.search(artist_name)
+            data = self.client.search(artist_name, refresh=refresh)
             try:
                 artist_id = extract_artist_id(data)
             except (KeyError, TypeError, IndexError):
                 write(f"Artist '{artist_name}' not found", Color.RED)
             else:
-                self._id(artist_id)
+                self._id(artist_id, refresh=refresh)
 
     @handle_connection_errors
-    def _id(self, artist_id: str) -> None:
+    def _id(self, artist_id: str, refresh: bool = False) -> None:
         if not artist_id:
             write("Missing argument: artist id", Color.RED)
         else:
-            data = self.client.browse(f"MPAD{artist_id}")
+            data = self.client.browse(f"MPAD{artist_id}", refresh=refresh)
+            albums: List[Album] = []
             try:
-                artist_music_data = extract_albums(data)
+                artist_name = extract_artist_name(data)
+                # Albums are listed as soon as each page arrives, so the
+                # indexes follow the order of the catalog.
+                for album in iter_albums(self.client, data):
+                    print_album(len(albums), album)
+                    self.covers.prefetch([album.thumbnail_url])
+                    albums.append(album)
             except (KeyError, TypeError, IndexError):
-                write(f"Content not found", Color.RED)
+                if not albums:
+                    write(f"Content not found", Color.RED)
+                    return
+                write(f"Listing may be incomplete", Color.YELLOW)
+            self._albums, self._artist_name = albums, artist_name
+            write(f"Collected music for {self._artist_name}", Color.GREEN)
+
+    def _refresh(self) -> None:
+        if self._last_query is None:
+            write("Nothing to refresh.", Color.RED)
+            write("Use the search/id command", Color.RED)
+        else:
+            cmd, args = self._last_query
+            if cmd == Command.SEARCH:
+                self._search(args, refresh=True)
             else:
-                artist_music_data: Tuple[List[Album], str]
-                self._albums, self._artist_name = artist_music_data
-                self._albums.sort(key=lambda x: x.title)
-                write(f"Collected music for {self._artist_name}", Color.GREEN)
-                print_albums_list(self._albums)
+                self._id(args, refresh=True)
 
     def _download(self, indexes: str):
+        from requests.exceptions import RequestException
         if not self._albums or not self._artist_name:
             write("You need to search for music first.", Color.RED)
             write("Use the search/id command", Color.RED)
@@ -155,27 +314,49 @@ class App:
                 for album in albums:
                     write(f"\u2022 {album.title}", Color.BOLD)
 
+                jobs: List[Job] = []
                 for album in albums:
-                    write(f":: Downloading: {album.title}", Color.GREEN)
-
                     try:
-                        response = request.urlopen(album.thumbnail_url)
-                        image_data = response.read()
-                    except URLError:
+                        image_data = self.covers.get(album.thumbnail_url)
+                    except RequestException:
                         write(f"An error occurred while downloading {album.title} cover art", Color.RED)
                         write(f"Skipping {album.title}", Color.YELLOW)
-                    else:
-                        for song, error in self.downloader.download_album(
-                                album=album, 
-                                artist=self._artist_name,
-                                image_data=image_data
-                        ):
-                            print()
+                        continue
+                    except OSError as error:
+                        # The cover cache could not be read or written.
+                        write(f"Cover art of {album.title} unavailable: {error}", Color.YELLOW)
+                        image_data = b""
+                    jobs.append(Job(album=album, artist=self._artist_name, image_data=image_data))
+
+                with self.progress:
+                    for song, stage, error in self.scheduler.run(jobs):
+                        if stage == Stage.DOWNLOAD:
+                            self.progress.remove(song)
                             if error:
-                                write(f"An error occurred while downloading {song.title}", Color.RED)
-                                write(f"Reason: {str(error)}", Color.RED)
+                                self.progress.write(f"An error occurred while downloading {song.title}", Color.RED)
+                                self.progress.write(f"Reason: {str(error)}", Color.RED)
+                        elif stage == Stage.SKIP:
+                            self.progress.write(f":: Already downloaded: {song.title}", Color.BLUE)
+                        elif error:
+                            self.progress.write(f"An error occurred while converting {song.title}", Color.RED)
+                            self.progress.write(f"Reason: {str(error)}", Color.RED)
+                        else:
+                            self.progress.write(f":: Converted: {song.title}", Color.BLUE)
                 print('\033[?25h', end="")
 
+    def _on_album_complete(
+            self,
+            album: Album,
+            downloaded: int,
+            total: int,
+            error: Optional[str] = None
+    ) -> None:
+        if error is not None:
+            self.progress.write(f":: Failed: {album.title}: {error}", Color.RED)
+            return
+        col = Color.GREEN if downloaded == total else Color.YELLOW
+        self.progress.write(f":: Completed: {album.title} ({downloaded}/{total})", col)
+
     def _filter(self, pattern: str) -> None:
         if not self._albums or not self._artist_name:
             write("You need to search for music first.", Color.RED)
@@ -189,7 +370,25 @@ class App:
             else:
                 write(f"No match found", Color.RED)
 
-    @staticmethod
-    def _exit():
+    def close(self) -> None:
+        # Called by _exit and again by the caller of main_loop.
+        if self._closed:
+            return
+        self._closed = True
+        if self._downloader is not None:
+            self._downloader.close()
+        # The session report is written once every transcode is done.
+        if self.metrics_path:
+            self.metrics.write_json(self.metrics_path)
+        if self.prometheus_path:
+            self.metrics.write_prometheus(self.prometheus_path)
+        if self.cassette is not None and self.cassette.recording:
+            self.cassette.save()
+        if self._cassette_dir is not None:
+            self._cassette_dir.cleanup()
+            self._cassette_dir = None
+
+    def _exit(self):
+        self.close()
         sys.stdout.write('\033[?25h')
         sys.exit(0)
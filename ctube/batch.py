@@ -0,0 +1,203 @@
+import json
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Tuple
+from ctube.app import App
+from ctube.colors import Color
+from ctube.containers import Album, Job, Song, Stage
+from ctube.errors import InvalidIndexSyntax
+from ctube.helpers import filter_albums_by_indexes, filter_albums_by_regex
+from ctube.extractors import extract_artist_id, extract_artist_name, iter_albums
+
+
+@dataclass
+class Selection:
+    """Albums of one artist to download, either by name or by id."""
+    artist: Optional[str] = None
+    artist_id: Optional[str] = None
+    indexes: str = "all"
+    pattern: Optional[str] = None
+
+
+@dataclass
+class TrackResult:
+    title: str
+    video_id: str
+    status: str  # downloaded, skipped or failed
+    filepath: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class AlbumResult:
+    title: str
+    playlist_id: str
+    tracks: List[TrackResult] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class SelectionResult:
+    selection: Selection
+    artist: Optional[str] = None
+    artist_id: Optional[str] = None
+    albums: List[AlbumResult] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def load_selections(filepath: str) -> List[Selection]:
+    """Reads a job file: a JSON list of selections, or {"jobs": [...]}.
+
+    Each selection has an "artist" name or an "id", and optionally
+    "indexes" (same syntax as the download command) and a "filter" regex.
+    """
+    with open(filepath) as file:
+        data = json.load(file)
+    if isinstance(data, dict):
+        data = data.get("jobs")
+    if not isinstance(data, list):
+        raise ValueError("A job file must contain a list of jobs")
+
+    selections: List[Selection] = []
+    for i, item in enumerate(data):
+        if not isinstance(item, dict) or not (item.get("artist") or item.get("id")):
+            raise ValueError(f"Job {i}: missing 'artist' or 'id'")
+        selections.append(
+            Selection(
+                artist=item.get("artist"),
+                artist_id=item.get("id"),
+                indexes=str(item.get("indexes", "all")),
+                pattern=item.get("filter")
+            )
+        )
+    return selections
+
+
+def list_albums(app: App, selection: Selection) -> Tuple[str, str, List[Album]]:
+    """Returns the artist id, the artist name and the albums of a selection."""
+    artist_id = selection.artist_id
+    if not artist_id:
+        artist_id = extract_artist_id(app.client.search(selection.artist))
+    data = app.client.browse(f"MPAD{artist_id}")
+    return artist_id, extract_artist_name(data), list(iter_albums(app.client, data))
+
+
+def select_albums(albums: List[Album], selection: Selection) -> List[Album]:
+    selected = filter_albums_by_indexes(albums, selection.indexes)
+    if selection.pattern:
+        matches = filter_albums_by_regex(albums, selection.pattern)
+        selected = [album for album in selected if album in matches.values()]
+    return selected
+
+
+def run(app: App, selections: List[Selection]) -> Tuple[Dict[str, Any], bool]:
+    """Downloads every selection as one batch.
+
+    Returns a JSON serializable summary and whether everything succeeded.
+    A KeyboardInterrupt ends the batch early, with a partial summary.
+    """
+    # Imported here: httpx, innertube and requests are only needed once
+    # something is actually requested.
+    from httpx import HTTPError
+    from innertube.errors import RequestError
+    from requests.exceptions import RequestException
+    from ctube.download import _format_error
+    from ctube.scheduler import Scheduler
+
+    results: List[SelectionResult] = []
+    albums: Dict[str, AlbumResult] = {}
+    jobs: List[Job] = []
+
+    def record(song: Song, status: str, error: Optional[str] = None) -> None:
+        albums[song.album.playlist_id].tracks.append(
+            TrackResult(
+                title=song.title,
+                video_id=song.video_id,
+                status=status,
+                filepath=song.filepath if status != "failed" else None,
+                error=error
+            )
+        )
+
+    def on_album_complete(album: Album, downloaded: int, total: int, error: Optional[str]) -> None:
+        if error is not None:
+            albums[album.playlist_id].error = error
+        app._on_album_complete(album, downloaded, total, error)
+
+    # On KeyboardInterrupt (Ctrl-C) the summary covers what was done so far.
+    interrupted = False
+    try:
+        for selection in selections:
+            result = SelectionResult(selection=selection)
+            results.append(result)
+            try:
+                result.artist_id, result.artist, listed = list_albums(app, selection)
+                selected = select_albums(listed, selection)
+            except (KeyError, TypeError, IndexError):
+                result.error = "Artist or content not found"
+            except InvalidIndexSyntax as error:
+                result.error = str(error)
+            except (HTTPError, RequestError, RequestException) as error:
+                result.error = _format_error(error)
+            else:
+                for album in selected:
+                    if album.playlist_id in albums:
+                        continue  # already part of the batch
+                    album_result = AlbumResult(title=album.title, playlist_id=album.playlist_id)
+                    result.albums.append(album_result)
+                    try:
+                        image_data = app.covers.get(album.thumbnail_url)
+                    except RequestException as error:
+                        album_result.error = _format_error(error)
+                        app.progress.write(f"{album.title}: {album_result.error}", Color.RED)
+                        continue
+                    except OSError as error:
+                        # The cover cache could not be read or written.
+                        app.progress.write(f"{album.title}: no cover art: {error}", Color.YELLOW)
+                        image_data = b""
+                    albums[album.playlist_id] = album_result
+                    jobs.append(Job(album=album, artist=result.artist, image_data=image_data))
+            if result.error:
+                app.progress.write(f"{_describe(selection)}: {result.error}", Color.RED)
+
+        scheduler = Scheduler(
+            downloader=app.downloader,
+            on_album_complete_callback=on_album_complete,
+            max_transfers=app.max_transfers,
+            max_albums=app.max_albums
+        )
+        with app.progress:
+            for song, stage, error in scheduler.run(jobs):
+                if stage == Stage.SKIP:
+                    record(song, "skipped")
+                elif error:
+                    if stage == Stage.DOWNLOAD:
+                        app.progress.remove(song)
+                    record(song, "failed", error)
+                    app.progress.write(f"Failed: {song.title}: {error}", Color.RED)
+                elif stage == Stage.TRANSCODE:
+                    record(song, "downloaded")
+    except KeyboardInterrupt:
+        interrupted = True
+        app.progress.write("Interrupted", Color.YELLOW)
+
+    tracks = [track for album in albums.values() for track in album.tracks]
+    counts = {
+        status: sum(track.status == status for track in tracks)
+        for status in ("downloaded", "skipped", "failed")
+    }
+    errors = sum(
+        (result.error is not None)
+        + sum(album.error is not None for album in result.albums)
+        for result in results
+    )
+    summary = {
+        **counts,
+        "errors": errors,
+        "interrupted": interrupted,
+        "jobs": [asdict(result) for result in results]
+    }
+    return summary, counts["failed"] == 0 and errors == 0 and not interrupted
+
+
+def _describe(selection: Selection) -> str:
+    return selection.artist or selection.artist_id or "?"
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+DEFAULT_TTLS: Dict[str, int] = {
+    "search": 60 * 60,
+    "browse": 6 * 60 * 60,
+}
+
+
+class ResponseCache:
+    """Keeps the last max_entries responses in memory and, with a path,
+       every response on disk. Files older than max_age seconds are
+       removed, then the oldest ones while over max_size bytes."""
+
+    def __init__(
+            self,
+            max_entries: int = 128,
+            path: Optional[str] = None,
+            max_size: int = 16 * 1024 * 1024,
+            max_age: int = max(DEFAULT_TTLS.values())
+    ):
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        self.max_entries = max_entries
+        self.path = path
+        self.max_size = max_size  # bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        if path is not None:
+            self._evict()
+
+    def _get_filepath(self, key: str) -> str:
+        assert self.path is not None
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str, ttl: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.path is not None:
+            try:
+                with open(self._get_filepath(key)) as file:
+                    created, data = json.load(file)
+            except (OSError, ValueError):
+                pass
+            else:
+                entry = (created, data)
+                self._remember(key, entry)
+        if entry is None or time.time() - entry[0] > ttl:
+            return None
+        return entry[1]
+
+    def set(self, key: str, data: Any) -> None:
+        entry = (time.time(), data)
+        self._remember(key, entry)
+        if self.path is not None:
+            filepath = self._get_filepath(key)
+            tmp_filepath = f"{filepath}.{threading.get_ident()}.tmp"
+            with open(tmp_filepath, "w") as file:
+                json.dump(entry, file)
+            os.replace(tmp_filepath, filepath)
+            self._evict()
+
+    def _evict(self) -> None:
+        assert self.path is not None
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.path):
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            expired_at = time.time() - self.max_age
+            total_size = sum(size for _, size, _ in entries)
+            for mtime, size, filepath in sorted(entries):
+                if mtime >= expired_at and total_size <= self.max_size:
+                    break
+                try:
+                    os.remove(filepath)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+
+    def _remember(self, key: str, entry: Tuple[float, Any]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class CachedClient:
+    """Wraps an InnerTube client, serving repeated calls from a ResponseCache."""
+
+    def __init__(
+            self,
+            client: Any,
+            cache: ResponseCache,
+            ttls: Optional[Dict[str, int]] = None
+    ):
+        self.client = client
+        self.cache = cache
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+
+    def _call(self, endpoint: str, refresh: bool, **kwargs: Any) -> Dict:
+        key = hashlib.sha256(
+            json.dumps([endpoint, kwargs], sort_keys=True).encode()
+        ).hexdigest()
+        if not refresh:
+            data = self.cache.get(key, ttl=self.ttls[endpoint])
+            if data is not None:
+                return data
+        data = getattr(self.client, endpoint)(**kwargs)
+        self.cache.set(key, data)
+        return data
+
+    def search(
+            self,
+            query: Optional[str] = None,
+            *,
+            params: Optional[str] = None,
+            continuation: Optional[str] = None,
+            refresh: bool = False
+    ) -> Dict:
+        return self._call(
+            "search", refresh, query=query, params=params, continuation=continuation
+        )
+
+    def browse(
+            self,
+            browse_id: Optional[str] = None,
+            *,
+            params: Optional[str] = None,
+            continuation: Optional[str] = None,
+            refresh: bool = False
+    ) -> Dict:
+        return self._call(
+            "browse", refresh, browse_id=browse_id, params=params, continuation=continuation
+        )
@@ -1,65 +1,80 @@
 import os
-import sys
-import shutil
-import eyed3
-from pydub import AudioSegment
+import base64
 from ctube.containers import Song
+from ctube.errors import TaggingError
+from ctube.formats import OutputFormat, OutputProfile
+from ctube.metrics import record_stage
 
 
-def on_progress_callback(
-        song: Song,
-        filesize: int, 
-        bytes_received: int, 
-) -> None:
-    columns = shutil.get_terminal_size().columns
-    max_width = int(columns * 0.40)
-    filled = int(round(max_width * bytes_received / float(filesize)))
-    remaining = max_width - filled
-    progress_bar = "#" * filled + "-" * remaining
-    percent = round(100.0 * bytes_received / float(filesize), 1)
+def on_complete_callback(song: Song) -> str:
+    # Runs in a worker process of the Downloader's Transcoder. The
+    # transcoding and tagging libraries are only imported there.
+    from ctube.encoder import encode_file
+    from mutagen import MutagenError
 
-    distance_from_bar = columns - (max_width + 9)  # len bar + percentage len
-    title = f":: {song.title} "
+    output_format = song.output_format
+    outputs = song.outputs or [
+        (f"{os.path.splitext(song.filepath)[0]}.{output_format.value}", OutputProfile(output_format))
+    ]
+    if song.filepath != outputs[0][0]:  # not already encoded while streaming
+        with record_stage("transcode"):
+            encode_file(song.filepath, outputs, source_subtype=output_format.subtype, song=song)
+            os.remove(song.filepath)
 
-    if len(title) > distance_from_bar:
-        title = f"{title[:distance_from_bar - 4]}... "
-    else:
-        title = f"{title}{' ' * (distance_from_bar - len(title))}"
+    # MP3 tags and cover are written by the encoder, in the same pass.
+    # mutagen errors are raised as TaggingError: the main process only
+    # knows ctube's exceptions.
+    for output, profile in outputs:
+        try:
+            if profile.output_format == OutputFormat.M4A:
+                with record_stage("tag"):
+                    set_mp4_metadata(filepath=output, song=song)
+            elif profile.output_format == OutputFormat.OPUS:
+                with record_stage("tag"):
+                    set_opus_metadata(filepath=output, song=song)
+        except MutagenError as err:
+            raise TaggingError(f"{output}: {err}") from err
+    return outputs[0][0]
 
-    text = f"{title}[{progress_bar}] {percent}%\r"
 
-    sys.stdout.write(text)
-    sys.stdout.flush()
-
-
-def on_complete_callback(song: Song) -> None:
-    output = f"{os.path.splitext(song.filepath)[0]}.mp3"
-    mp4 = AudioSegment.from_file(song.filepath, "mp4")
-    mp4.export(output, format="mp3")
-    set_metadata(filepath=output, song=song)
-    os.remove(song.filepath)
+def set_mp4_metadata(filepath: str, song: Song) -> None:
+    from mutagen.mp4 import MP4, MP4Cover
+    audio = MP4(filepath)
+    album = song.album
+    audio["\xa9nam"] = song.title
+    audio["\xa9ART"] = song.artist
+    audio["trkn"] = [(song.track_num, 0)]
+    if song.image_data:
+        audio["covr"] = [MP4Cover(song.image_data, imageformat=MP4Cover.FORMAT_JPEG)]
+    album_type = album.album_type.lower()
+    if album_type != "album":
+        audio["----:com.apple.iTunes:RELEASETYPE"] = [album_type.encode()]
+    audio["\xa9alb"] = album.title
+    audio["\xa9day"] = str(album.release_year)
+    audio.save()
 
 
-def set_metadata(filepath: str, song: Song) -> None:
-    audio = eyed3.load(filepath)
+def set_opus_metadata(filepath: str, song: Song) -> None:
+    from mutagen.flac import Picture
+    from mutagen.oggopus import OggOpus
+    audio = OggOpus(filepath)
     album = song.album
-    if audio and audio.tag:
-        tag = audio.tag
-        # Song tag
-        tag.title = song.title
-        tag.artist = song.artist
-        tag.track_num = song.track_num
-        tag.images.set(3, song.image_data, "image/jpeg", u"cover")
+    audio["title"] = song.title
+    audio["artist"] = song.artist
+    audio["tracknumber"] = str(song.track_num)
+
+    # Vorbis comments carry the cover as a base64 encoded FLAC picture block.
+    if song.image_data:
+        picture = Picture()
+        picture.type = 3  # front cover
+        picture.mime = "image/jpeg"
+        picture.desc = u"cover"
+        picture.data = song.image_data
+        audio["metadata_block_picture"] = base64.b64encode(picture.write()).decode("ascii")
 
-        # Album tag
-        # eyed3.tag supported album_type values:
-        # lp, ep, compilation, live, various, demo, sigle
-        album_type = album.album_type.lower()
-        if album_type != "album":
-            try:
-                tag.album_type = album_type 
-            except ValueError:
-                pass  # TODO: log error
-        tag.album = album.title
-        tag.release_year = album.release_year
-        tag.save()
+    album_type = album.album_type.lower()
+    if album_type != "album":
+        audio["releasetype"] = album_type
+    audio["album"] = album.title
+    audio["date"] = str(album.release_year)
+    audio.save()
@@ -0,0 +1,301 @@
+import io
+import os
+import json
+import gzip
+import time
+import base64
+import threading
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+from ctube.errors import CassetteMiss
+
+if TYPE_CHECKING:
+    import requests
+
+
+CASSETTE_VERSION = 1
+# Response headers kept by the recorder, the rest is left out.
+KEPT_HEADERS = ("Content-Type", "Content-Range", "Retry-After")
+
+
+class RecordedStream:
+    """The part of a pytubefix Stream used by the Downloader."""
+
+    def __init__(
+            self,
+            url: str,
+            itag: int,
+            mime_type: str,
+            bitrate: Optional[int],
+            filesize: int,
+            expiration: datetime
+    ):
+        self.url = url
+        self.itag = itag
+        self.mime_type = mime_type
+        self.type, self.subtype = mime_type.split("/")
+        self.bitrate = bitrate
+        self.filesize = filesize
+        self.expiration = expiration
+
+
+class RecordedStreamQuery(list):
+    """The part of a pytubefix StreamQuery used by the Downloader."""
+
+    def filter(
+            self,
+            only_audio: bool = False,
+            subtype: Optional[str] = None
+    ) -> "RecordedStreamQuery":
+        return RecordedStreamQuery(
+            stream for stream in self
+            if (not only_audio or stream.type == "audio")
+            and (subtype is None or stream.subtype == subtype)
+        )
+
+
+class Cassette:
+    """Records the InnerTube calls, stream manifests and HTTP exchanges
+       of a session to a gzipped JSON file, or serves them back.
+
+       Exchanges are replayed in their recorded order, the last one is
+       repeated once they run out. Replayed responses are delayed by
+       their recorded duration times time_scale, 0 disables the delays.
+       Stream bytes are never stored: range requests are answered with
+       zeros, at the recorded latency and throughput. HTTP requests
+       missing from the cassette get a 404."""
+
+    def __init__(self, path: str, mode: str = "replay", time_scale: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Invalid cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.time_scale = time_scale
+        self._lock = threading.Lock()
+        self._exchanges: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursors: Dict[str, int] = {}
+        if mode == "replay":
+            with gzip.open(path, "rt") as file:
+                data = json.load(file)
+            if data.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"Unsupported cassette version: {data.get('version')}")
+            self._exchanges = data["exchanges"]
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    def record(self, key: str, exchange: Dict[str, Any]) -> None:
+        with self._lock:
+            self._exchanges.setdefault(key, []).append(exchange)
+
+    def replay(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if not exchanges:
+                raise CassetteMiss(f"Not in cassette: {key}")
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+        return exchanges[min(cursor, len(exchanges) - 1)]
+
+    def sleep(self, duration: float) -> None:
+        if duration > 0 and self.time_scale > 0:
+            time.sleep(duration * self.time_scale)
+
+    def save(self) -> None:
+        with self._lock:
+            data = {
+                "version": CASSETTE_VERSION,
+                "recorded_at": time.time(),
+                "exchanges": self._exchanges
+            }
+            tmp_path = f"{self.path}.tmp"
+            with gzip.open(tmp_path, "wt") as file:
+                json.dump(data, file, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def wrap_client(self, client: Optional[Any] = None) -> "CassetteClient":
+        return CassetteClient(self, client)
+
+    def wrap_resolve(self, resolve: Callable[[str], Any]) -> Callable[[str], Any]:
+        """Wraps the function resolving the stream manifest of a video id."""
+
+        def recording_resolve(video_id: str) -> Any:
+            started = time.perf_counter()
+            streams = resolve(video_id)
+            elapsed = time.perf_counter() - started
+            self.record(f"manifest {video_id}", {
+                "elapsed": elapsed,
+                "streams": [_dump_stream(stream) for stream in streams.filter(only_audio=True)]
+            })
+            return streams
+
+        def replaying_resolve(video_id: str) -> RecordedStreamQuery:
+            exchange = self.replay(f"manifest {video_id}")
+            self.sleep(exchange["elapsed"])
+            return RecordedStreamQuery(_load_stream(stream) for stream in exchange["streams"])
+
+        return recording_resolve if self.recording else replaying_resolve
+
+    def adapter(self, inner: Any) -> Any:
+        """Returns the transport adapter to mount on the shared session.
+           inner is the adapter doing the actual requests while recording."""
+        if self.recording:
+            return _RecordingAdapter(self, inner)
+        inner.close()
+        return _ReplayAdapter(self)
+
+
+class CassetteClient:
+    """Stands for an InnerTube client: records the calls made to client,
+       or replays them from the cassette."""
+
+    def __init__(self, cassette: Cassette, client: Optional[Any] = None):
+        if cassette.recording and client is None:
+            raise ValueError("A client is required to record")
+        self.cassette = cassette
+        self.client = client
+
+    def _call(self, endpoint: str, **kwargs: Any) -> Dict:
+        key = f"innertube {json.dumps([endpoint, kwargs], sort_keys=True)}"
+        if self.cassette.recording:
+            started = time.perf_counter()
+            data = getattr(self.client, endpoint)(**kwargs)
+            elapsed = time.perf_counter() - started
+            self.cassette.record(key, {"elapsed": elapsed, "response": data})
+            return data
+        exchange = self.cassette.replay(key)
+        self.cassette.sleep(exchange["elapsed"])
+        return exchange["response"]
+
+    def search(
+            self,
+            query: Optional[str] = None,
+            *,
+            params: Optional[str] = None,
+            continuation: Optional[str] = None
+    ) -> Dict:
+        return self._call("search", query=query, params=params, continuation=continuation)
+
+    def browse(
+            self,
+            browse_id: Optional[str] = None,
+            *,
+            params: Optional[str] = None,
+            continuation: Optional[str] = None
+    ) -> Dict:
+        return self._call(
+            "browse", browse_id=browse_id, params=params, continuation=continuation
+        )
+
+
+def _dump_stream(stream: Any) -> Dict[str, Any]:
+    return {
+        "url": stream.url,
+        "itag": stream.itag,
+        "mime_type": stream.mime_type,
+        "bitrate": stream.bitrate,
+        "filesize": stream.filesize,
+        # Relative, so a replayed manifest is as fresh as the recorded one.
+        "expires_in": stream.expiration.timestamp() - time.time()
+    }
+
+
+def _load_stream(data: Dict[str, Any]) -> RecordedStream:
+    return RecordedStream(
+        url=data["url"],
+        itag=data["itag"],
+        mime_type=data["mime_type"],
+        bitrate=data["bitrate"],
+        filesize=data["filesize"],
+        expiration=datetime.fromtimestamp(time.time() + data["expires_in"])
+    )
+
+
+def _parse_range(header: str) -> Tuple[int, Optional[int]]:
+    start, _, end = header.split("=", 1)[1].partition("-")
+    return int(start), int(end) if end else None
+
+
+class _RecordingAdapter:
+    def __init__(self, cassette: Cassette, inner: Any):
+        self.cassette = cassette
+        self.inner = inner
+
+    def send(self, request: "requests.PreparedRequest", **kwargs: Any) -> "requests.Response":
+        started = time.perf_counter()
+        response = self.inner.send(request, **kwargs)
+        latency = time.perf_counter() - started
+        body = response.content
+        exchange: Dict[str, Any] = {
+            "status": response.status_code,
+            "headers": {
+                name: response.headers[name] for name in KEPT_HEADERS if name in response.headers
+            },
+            "latency": latency,
+            "elapsed": time.perf_counter() - started,
+            "size": len(body)
+        }
+        # Stream ranges are only recorded as sizes and timings.
+        if "Range" not in request.headers:
+            exchange["body"] = base64.b64encode(body).decode()
+        self.cassette.record(f"http {request.method} {request.url}", exchange)
+        return response
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+class _ReplayAdapter:
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+
+    def send(self, request: "requests.PreparedRequest", **kwargs: Any) -> "requests.Response":
+        from requests.models import Response
+        from requests.structures import CaseInsensitiveDict
+        from requests.utils import get_encoding_from_headers
+
+        try:
+            exchange = self.cassette.replay(f"http {request.method} {request.url}")
+        except CassetteMiss:
+            exchange = {"status": 404, "headers": {}, "latency": 0, "elapsed": 0, "body": ""}
+        headers = CaseInsensitiveDict(exchange["headers"])
+        if "body" in exchange:
+            body = base64.b64decode(exchange["body"])
+            self.cassette.sleep(exchange["elapsed"])
+        else:
+            body = self._make_range(request, exchange, headers)
+
+        response = Response()
+        response.status_code = exchange["status"]
+        response.headers = headers
+        response.raw = io.BytesIO(body)
+        response.url = request.url or ""
+        response.request = request
+        response.reason = "Replayed"
+        response.encoding = get_encoding_from_headers(headers)
+        return response
+
+    def _make_range(self, request: Any, exchange: Dict[str, Any], headers: Any) -> bytes:
+        if exchange["status"] >= 400:
+            self.cassette.sleep(exchange["latency"])
+            return b""
+        # The requested range may differ from the recorded one, e.g. with
+        # other chunk sizes: its size comes from the request, its duration
+        # from the recorded latency and throughput.
+        start, end = _parse_range(request.headers["Range"])
+        total = int(exchange["headers"].get("Content-Range", "/0").rsplit("/", 1)[1]) or None
+        if end is None or (total is not None and end >= total):
+            end = (total if total is not None else start + exchange["size"]) - 1
+        size = max(end - start + 1, 0)
+        transfer_time = max(exchange["elapsed"] - exchange["latency"], 0)
+        duration = exchange["latency"]
+        if exchange["size"]:
+            duration += transfer_time * size / exchange["size"]
+        self.cassette.sleep(duration)
+        headers["Content-Range"] = f"bytes {start}-{end}/{total if total is not None else '*'}"
+        headers["Content-Length"] = str(size)
+        return bytes(size)
+
+    def close(self) -> None:
+        pass
@@ -1,31 +1,269 @@
 import sys
+import json
 import socket
-from typing import Optional
+import argparse
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
 from signal import signal, SIGINT
-from pytubefix import request
-from ctube.app import App
+from ctube import transfer
+from ctube.colors import Color, color
+from ctube.errors import InvalidIndexSyntax
+from ctube.formats import OutputFormat, OutputProfile, parse_profile
+from ctube.parser import parse_indexes
 from ctube.paths import MUSIC
 
 
-def signal_handler(_: Optional[int] = None):
+APP_OPTIONS: Dict[str, Any] = dict(
+    output_path=MUSIC,
+    skip_existing=True,
+    timeout=5,
+    max_retries=3,
+    max_workers=4,
+    max_transfers=8,
+    max_host_connections=4,
+    max_albums=2,
+    streaming=False,
+    output_format=OutputFormat.MP3,
+    profiles=None,
+    max_bitrate=None,
+    cover_cache_size=64 * 1024 * 1024,
+    response_cache_ttls=None,
+    prefetch=2,
+    pool_size=16,
+    min_chunk_size=transfer.MIN_CHUNK_SIZE,
+    max_chunk_size=transfer.MAX_CHUNK_SIZE,
+    max_rate=None,
+    throttle_retries=5,
+    update_check_interval=24 * 60 * 60,
+    metrics_path=None,
+    prometheus_path=None
+)
+
+
+def signal_handler(signum: Optional[int] = None):
+    # Running transfers stop at the next chunk and keep their
+    # '.part' files, the next run resumes them.
+    transfer.stop()
     print('\033[?25h', end="")
-    sys.exit(0)
+    sys.exit(128 + SIGINT if signum == SIGINT else 0)
+
+
+def _interrupt(signum: int, _: Any) -> None:
+    # download and batch: the run ends early and still writes its summary.
+    transfer.stop()
+    raise KeyboardInterrupt
 
 
 socket.setdefaulttimeout(3)
 signal(SIGINT, lambda signum, _: signal_handler(signum))
-request.default_range_size = request.default_range_size // 15
 
 
-def main() -> None:
+def _parse_profile(spec: str) -> OutputProfile:
+    try:
+        return parse_profile(spec)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(f"invalid profile '{spec}': {error}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="ctube",
+        description="Without a command, ctube starts the interactive prompt."
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument(
+        "--record", metavar="PATH", help="record the session's requests to a cassette file"
+    )
+    cassette.add_argument(
+        "--replay", metavar="PATH", help="serve the session's requests from a cassette file"
+    )
+    parser.add_argument(
+        "--replay-scale",
+        type=float,
+        default=1.0,
+        metavar="FACTOR",
+        help="multiplies the recorded response times, 0 replays without delays"
+    )
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    search = commands.add_parser("search", help="list the albums of an artist found by name")
+    search.add_argument("artist", help="artist name")
+    search.add_argument("--json", action="store_true", help="print the albums as JSON")
+
+    id_ = commands.add_parser("id", help="list the albums of an artist by channel id")
+    id_.add_argument("artist_id", help="id of the artist's channel (music.youtube.com)")
+    id_.add_argument("--json", action="store_true", help="print the albums as JSON")
+
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("-o", "--output", default=MUSIC, help="output directory")
+    output.add_argument(
+        "-f", "--format",
+        choices=[output_format.value for output_format in OutputFormat],
+        default=OutputFormat.MP3.value,
+        help="output format"
+    )
+    output.add_argument(
+        "--profile",
+        action="append",
+        type=_parse_profile,
+        dest="profiles",
+        metavar="SPEC",
+        help="output profile 'format[:kbps[:hz[:directory]]]', repeatable; "
+             "the first one replaces --format"
+    )
+    output.add_argument("--max-bitrate", type=int, metavar="KBPS", help="highest stream bitrate")
+    output.add_argument("--max-rate", type=int, metavar="BYTES", help="bandwidth cap, bytes per second")
+    output.add_argument("--streaming", action="store_true", help="encode while downloading")
+    output.add_argument("--overwrite", action="store_true", help="download existing songs again")
+    output.add_argument("--metrics", metavar="PATH", help="write a JSON report of per-stage metrics")
+    output.add_argument(
+        "--prometheus", metavar="PATH", help="write the metrics as a node_exporter textfile"
+    )
+    output.add_argument(
+        "--summary",
+        default="-",
+        metavar="PATH",
+        help="file receiving the JSON summary, '-' for stdout (default)"
+    )
+
+    download = commands.add_parser(
+        "download", parents=[output], help="download the albums of an artist"
+    )
+    download.add_argument("artist", help="artist name, or channel id with --id")
+    download.add_argument("--id", action="store_true", dest="by_id", help="artist is a channel id")
+    download.add_argument(
+        "-i", "--indexes", default="all", help="albums to download: 'all', 'x', 'x, y, z' or 'x:y'"
+    )
+    download.add_argument("--filter", dest="pattern", help="only albums matching this regex")
+
+    batch = commands.add_parser(
+        "batch", parents=[output], help="download the selections of a JSON job file"
+    )
+    batch.add_argument("jobfile", help="JSON list of {artist|id, indexes, filter} objects")
+    return parser
+
+
+def _print_error(message: str) -> None:
+    sys.stderr.write(f"{color(message, Color.RED)}\n")
+
+
+def _app_options(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        **APP_OPTIONS,
+        "record_path": args.record,
+        "replay_path": args.replay,
+        "replay_time_scale": args.replay_scale
+    }
+
+
+def _list(args: argparse.Namespace) -> int:
+    from ctube.app import App
+    from ctube.batch import Selection, list_albums
+    from ctube.helpers import handle_connection_errors
+    from ctube.printers import print_albums_list, write
+
+    app = App(**_app_options(args))
+    if args.command == "search":
+        selection = Selection(artist=args.artist)
+    else:
+        selection = Selection(artist_id=args.artist_id)
+    try:
+        # stdout only carries the listing, --json output stays parseable.
+        listing = handle_connection_errors(list_albums, report=_print_error)(app, selection)
+    except (KeyError, TypeError, IndexError):
+        _print_error("Artist not found")
+        return 1
+    finally:
+        app.close()
+    if listing is None:  # the error was already reported
+        return 1
+
+    artist_id, artist_name, albums = listing
+    if args.json:
+        print(json.dumps(
+            {
+                "artist": artist_name,
+                "artist_id": artist_id,
+                "albums": [asdict(album) for album in albums]
+            },
+            indent=2
+        ))
+    else:
+        write(f"{artist_name} ({artist_id})", Color.GREEN)
+        print_albums_list(albums)
+    return 0
+
+
+def _download(args: argparse.Namespace, parser: argparse.ArgumentParser) -> int:
+    from ctube.app import App
+    from ctube.batch import Selection, load_selections, run
+    from ctube.progress import ProgressRenderer
+
+    if args.command == "batch":
+        try:
+            selections = load_selections(args.jobfile)
+        except (OSError, ValueError) as error:
+            parser.error(f"invalid job file: {error}")
+    elif args.by_id:
+        selections = [Selection(artist_id=args.artist, indexes=args.indexes, pattern=args.pattern)]
+    else:
+        selections = [Selection(artist=args.artist, indexes=args.indexes, pattern=args.pattern)]
+
+    for selection in selections:
+        try:
+            parse_indexes(selection.indexes)
+        except InvalidIndexSyntax as error:
+            parser.error(str(error))
+
+    # stdout is reserved to the summary, progress is reported on stderr.
     app = App(
-        output_path=MUSIC, 
-        skip_existing=False,
-        timeout=5,
-        max_retries=3
+        **{
+            **_app_options(args),
+            "output_path": args.output,
+            "output_format": OutputFormat(args.format),
+            "profiles": args.profiles,
+            "max_bitrate": args.max_bitrate,
+            "max_rate": args.max_rate,
+            "streaming": args.streaming,
+            "skip_existing": not args.overwrite,
+            "metrics_path": args.metrics,
+            "prometheus_path": args.prometheus,
+            "progress": ProgressRenderer(stream=sys.stderr)
+        }
     )
-    app.main_loop()
-    signal_handler()
+    signal(SIGINT, _interrupt)
+    try:
+        summary, ok = run(app, selections)
+    finally:
+        app.close()
+
+    if args.summary == "-":
+        print(json.dumps(summary, indent=2))
+    else:
+        with open(args.summary, "w") as file:
+            json.dump(summary, file, indent=2)
+    if summary["interrupted"]:
+        return 128 + SIGINT
+    return 0 if ok else 1
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        from ctube.app import App
+        app = App(**_app_options(args))
+        # main_loop usually ends with Ctrl-C, through signal_handler's
+        # SystemExit: reports and recordings are still written.
+        try:
+            app.main_loop()
+        finally:
+            app.close()
+        signal_handler()
+    elif args.command in ("search", "id"):
+        sys.exit(_list(args))
+    else:
+        sys.exit(_download(args, parser))
 
 
 if __name__ == "__main__":
@@ -47,6 +47,14 @@ class Command(Enum):
         )
     )
 
+    REFRESH = _Command(
+        name="refresh",
+        description=(
+            "Repeats the last 'search' or 'id' command, bypassing\n"
+            "the cache of previous responses."
+        )
+    )
+
     FILTER = _Command(
         name="filter",
         description=(
@@ -1,4 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import List, Optional, Tuple
+from ctube.formats import OutputFormat, OutputProfile
 
 
 @dataclass
@@ -10,6 +13,14 @@ class Album:
     playlist_id: str
 
 
+@dataclass
+class Track:
+    video_id: str
+    title: str
+    duration: Optional[int]  # seconds, None when not listed
+    track_num: int
+
+
 @dataclass
 class Song:
     title: str
@@ -18,3 +29,21 @@ class Song:
     image_data: bytes
     filepath: str
     album: Album
+    output_format: OutputFormat = OutputFormat.MP3
+    video_id: str = ""
+    # (filepath, profile) of every file produced from the song, the
+    # first one is the primary output.
+    outputs: List[Tuple[str, OutputProfile]] = field(default_factory=list)
+
+
+@dataclass
+class Job:
+    album: Album
+    artist: str
+    image_data: bytes
+
+
+class Stage(Enum):
+    DOWNLOAD = "download"
+    TRANSCODE = "transcode"
+    SKIP = "skip"
@@ -0,0 +1,88 @@
+import os
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable
+from ctube import transport
+
+
+class CoverCache:
+    def __init__(
+            self,
+            path: str,
+            max_size: int = 64 * 1024 * 1024,
+            timeout: int = 5,
+            max_workers: int = 8
+    ):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_size = max_size  # bytes
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+
+    def _get_filepath(self, url: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(url.encode()).hexdigest())
+
+    def _fetch(self, url: str) -> bytes:
+        filepath = self._get_filepath(url)
+        try:
+            with open(filepath, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            response = transport.get_session().get(url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.content
+            tmp_filepath = f"{filepath}.{threading.get_ident()}.tmp"
+            with open(tmp_filepath, "wb") as file:
+                file.write(data)
+            os.replace(tmp_filepath, filepath)
+            self._evict()
+        else:
+            os.utime(filepath)  # mtime is the LRU clock
+        return data
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.path):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, filepath in sorted(entries):
+                if total_size <= self.max_size:
+                    break
+                try:
+                    os.remove(filepath)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+
+    def _submit(self, url: str) -> Future:
+        with self._lock:
+            future = self._futures.get(url)
+            if future is None:
+                future = self._futures[url] = self._executor.submit(self._fetch, url)
+                submitted = True
+            else:
+                submitted = False
+        if submitted:
+            # Outside the lock: the callback runs at once if already done.
+            future.add_done_callback(lambda _: self._forget(url, future))
+        return future
+
+    def _forget(self, url: str, future: Future) -> None:
+        # Once fetched the cover lives on disk, and get() reads it from
+        # there; failed fetches are retried.
+        with self._lock:
+            if self._futures.get(url) is future:
+                del self._futures[url]
+
+    def prefetch(self, urls: Iterable[str]) -> None:
+        for url in urls:
+            self._submit(url)
+
+    def get(self, url: str) -> bytes:
+        return self._submit(url).result()
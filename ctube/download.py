@@ -1,35 +1,158 @@
 import os
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from urllib.error import HTTPError, URLError
 from pathvalidate import sanitize_filename
 from http.client import IncompleteRead
 from enum import Enum
-from typing import Callable, Generator
-from ctube.containers import Album, Song
-from pytubefix import Playlist, Stream, YouTube
+import httpx
+from innertube.clients import InnerTube
+from innertube.errors import RequestError as InnerTubeRequestError
+from requests.exceptions import RequestException
+from typing import Any, Callable, Deque, Dict, Generator, List, Optional, Sequence, Tuple, Union
+from ctube.containers import Album, Song, Stage, Track
+from ctube.ledger import Ledger, LedgerEntry
+from ctube.limits import HostBackoff, HostLimiter, TokenBucket
+from ctube.manifest import ManifestCache
+from ctube.cassette import Cassette
+from ctube.metrics import Metrics
+from ctube.transcode import Transcoder
+from ctube.encoder import encode_stream
+from ctube import transfer
+from ctube.formats import OutputFormat, OutputProfile
+from ctube.extractors import extract_tracks
+from pytubefix import Stream, StreamQuery, YouTube
 from pytubefix.exceptions import VideoUnavailable, RegexMatchError
-from ctube.errors import NoMP4StreamAvailable, EmptyStreamQuery
+from ctube.errors import (
+    NoStreamAvailable,
+    NoMP4StreamAvailable,
+    EmptyStreamQuery,
+    EncoderError,
+    TaggingError,
+    TransferError,
+    CassetteMiss
+)
+
+
+# Failures of a single track, reported instead of raised.
+DOWNLOAD_ERRORS = (
+    VideoUnavailable,
+    IncompleteRead,
+    TimeoutError,
+    OSError,  # writing the stream, album directories are created on write
+    EmptyStreamQuery,
+    NoStreamAvailable,
+    EncoderError,
+    TransferError,
+    CassetteMiss,
+    HTTPError,
+    URLError,
+    RequestException,
+    RegexMatchError,
+    KeyError  # https://github.com/JuanBindez/pytubefix/issues/88
+)
+
+# Failures of a whole album, before any track is submitted: unexpected
+# browse payloads and request errors.
+ALBUM_ERRORS = (
+    KeyError,
+    TypeError,
+    IndexError,
+    OSError,
+    httpx.HTTPError,
+    InnerTubeRequestError,
+    RequestException,
+    CassetteMiss
+)
 
 
 class BaseURL(str, Enum):
-    PLAYLIST = "https://music.youtube.com/playlist?list="
+    WATCH = "https://www.youtube.com/watch?v="
+
+
+def _format_error(err: BaseException) -> str:
+    # built-in exceptions do not have __module__ attr.
+    if hasattr(err, "__module__"):
+        return f"{err.__module__}.{err.__class__.__name__}: {err}"
+    else:
+        return f"{err.__class__.__name__}: {err}"
 
 
 class Downloader:
     def __init__(
             self,
             output_path: str,
-            on_complete_callback: Callable[[Song], None],
+            on_complete_callback: Callable[[Song], str],
             on_progress_callback: Callable[[Song, int, int], None],
             skip_existing: bool = False,
             timeout: int = 5,
-            max_retries: int = 2
+            max_retries: int = 2,
+            max_workers: int = 4,
+            max_host_connections: Optional[int] = None,
+            transcode_workers: Optional[int] = None,
+            max_pending_transcodes: Optional[int] = None,
+            streaming: bool = False,
+            output_format: OutputFormat = OutputFormat.MP3,
+            profiles: Optional[Sequence[OutputProfile]] = None,
+            max_bitrate: Optional[int] = None,
+            client: Optional[Any] = None,
+            prefetch: int = 2,
+            chunk_size: int = transfer.DEFAULT_CHUNK_SIZE,
+            min_chunk_size: int = transfer.MIN_CHUNK_SIZE,
+            max_chunk_size: int = transfer.MAX_CHUNK_SIZE,
+            max_rate: Optional[int] = None,
+            throttle_retries: int = 5,
+            on_throttle_callback: Optional[Callable[[Song, float], None]] = None,
+            metrics: Optional[Metrics] = None,
+            cassette: Optional[Cassette] = None
     ):
         self.output_path = output_path
+        self.client = client if client is not None else InnerTube("WEB_REMIX")
         self.on_complete_callback = on_complete_callback 
         self.on_progress_callback = on_progress_callback
         self.skip_existing = skip_existing
         self.timeout = timeout
         self.max_retries = max_retries
+        self.max_workers = max_workers
+        self.streaming = streaming
+        # Every song is produced in each profile; the first one, the
+        # primary profile, selects the source stream and the album path.
+        self.profiles = list(profiles) if profiles else [OutputProfile(output_format)]
+        if len({(profile.directory, profile.output_format) for profile in self.profiles}) \
+                < len(self.profiles):
+            raise ValueError("Two output profiles share a format and a directory")
+        self.output_format = self.profiles[0].output_format
+        self.max_bitrate = max_bitrate  # kbps
+        self.host_limiter = HostLimiter(max_host_connections)
+        self.rate_limiter = TokenBucket(max_rate)  # bytes per second, shared by all transfers
+        self.backoff = HostBackoff(max_retries=throttle_retries)
+        self.on_throttle_callback = on_throttle_callback
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.ledger = Ledger(os.path.join(self.output_path, ".ctube.db"))
+        self.prefetch = prefetch
+        # chunk_size is the size of the first request of each transfer, the
+        # next ones adapt to the link within [min_chunk_size, max_chunk_size].
+        self.chunk_size = chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        # Only manifests go through the cassette here, the client and
+        # the shared session are wrapped by their owner.
+        resolve = self._resolve_streams
+        if cassette is not None:
+            resolve = cassette.wrap_resolve(resolve)
+        self.manifests = ManifestCache(
+            resolve=resolve,
+            max_entries=max_workers + 2 * prefetch,
+            max_workers=max(prefetch, 1)
+        )
+        self.transcoder = Transcoder(
+            func=on_complete_callback,
+            max_workers=transcode_workers,
+            max_pending=max_pending_transcodes,
+            on_stages=self._on_transcode_stages
+        )
 
     @property
     def output_path(self) -> str:
@@ -45,14 +168,62 @@ class Downloader:
             raise NotADirectoryError
         self._output_path = output_path
 
-    def _on_complete_callback(self, data: Song, filepath: str) -> None:
-        data.filepath = filepath
-        self.on_complete_callback(data)
+    def close(self) -> None:
+        self.manifests.shutdown()
+        self.transcoder.shutdown()
+        self.ledger.close()
+
+    def get_album_path(
+            self,
+            album: Album,
+            artist: str,
+            profile: Optional[OutputProfile] = None
+    ) -> str:
+        # Only the path: the directory is created once a file is written to it.
+        profile = profile if profile is not None else self.profiles[0]
+        fields = dict(
+            artist=artist,
+            album=album.title,
+            album_type=album.album_type.lower(),
+            year=album.release_year,
+            format=profile.output_format.value,
+            bitrate=profile.bitrate or ""
+        )
+        output_path = os.path.join(
+            self.output_path,
+            *[
+                sanitize_filename(part.format(**fields))
+                for part in profile.directory.split("/") if part
+            ]
+        )
+        return output_path
+
+    def get_outputs(
+            self,
+            title: str,
+            album: Album,
+            artist: str,
+            output_path: str
+    ) -> List[Tuple[str, OutputProfile]]:
+        """Returns the (filepath, profile) of every output of a song,
+           the primary one in output_path."""
+        filename = sanitize_filename(title)
+        return [
+            (
+                os.path.join(
+                    output_path if index == 0 else self.get_album_path(album, artist, profile),
+                    f"{filename}.{profile.output_format.value}"
+                ),
+                profile
+            )
+            for index, profile in enumerate(self.profiles)
+        ]
 
-    def _on_progress_callback(self, data: Song, bytes_remaining: int, stream: Stream) -> None:
-        filesize = stream.filesize
-        bytes_received = filesize - bytes_remaining
-        self.on_progress_callback(data, filesize, bytes_received)
+    def get_tracks(self, album: Album) -> List[Track]:
+        # The browse response and its continuations provide the whole
+        # track list, no per-track request is made until a stream is needed.
+        with self.metrics.measure("metadata"):
+            return extract_tracks(self.client, self.client.browse(f"VL{album.playlist_id}"))
 
     def download_album(
             self, 
@@ -60,74 +231,286 @@ class Downloader:
             artist: str, 
             image_data: bytes, 
     ) -> Generator:
-        output_path = os.path.join(
-            os.path.join(
-                self.output_path, sanitize_filename(artist)
-            ), 
-            sanitize_filename(album.title)
+        output_path = self.get_album_path(album, artist)
+        tracks = self.get_tracks(album)
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            # Tracks are resolved and downloaded concurrently, but results
+            # are yielded in playlist order.
+            # Tracks already in the ledger or in the output directory are
+            # not submitted at all.
+            completed = [
+                self.get_completed_track(
+                    track=track,
+                    album=album,
+                    artist=artist,
+                    image_data=image_data,
+                    output_path=output_path
+                )
+                for track in tracks
+            ]
+            pending = [track for track, song in zip(tracks, completed) if song is None]
+            futures: List[Union[Song, Future]] = [
+                song if song is not None else executor.submit(
+                    self.download_track,
+                    track=track,
+                    album=album,
+                    artist=artist,
+                    image_data=image_data,
+                    output_path=output_path,
+                    upcoming=pending
+                )
+                for track, song in zip(tracks, completed)
+            ]
+            # Transcodes run in the background; their results are reported
+            # in track order as soon as they are ready.
+            transcodes: Deque[Tuple[Song, Future]] = deque()
+            for future in futures:
+                if isinstance(future, Song):
+                    yield future, Stage.SKIP, None
+                    continue
+                song, error, transcode = future.result()
+                yield song, Stage.DOWNLOAD, error
+                if transcode is not None:
+                    transcodes.append((song, transcode))
+                while transcodes and transcodes[0][1].done():
+                    yield self.get_transcode_result(*transcodes.popleft())
+            while transcodes:
+                yield self.get_transcode_result(*transcodes.popleft())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def get_completed_track(
+            self,
+            track: Track,
+            album: Album,
+            artist: str,
+            image_data: bytes,
+            output_path: str
+    ) -> Optional[Song]:
+        if not self.skip_existing:
+            return None  # overwriting: the ledger is not consulted either
+        # A track is completed once every profile's output is.
+        outputs = self.get_outputs(
+            track.title, album=album, artist=artist, output_path=output_path
+        )
+        filepaths = []
+        for filepath, profile in outputs:
+            entry = self.ledger.get(
+                video_id=track.video_id,
+                playlist_id=album.playlist_id,
+                format=profile.key
+            )
+            if entry is not None:
+                filepath = entry.filepath
+            elif not os.path.exists(filepath):
+                return None
+            filepaths.append(filepath)
+        song = self._make_song(
+            track, album=album, artist=artist, image_data=image_data, filepath=filepaths[0]
         )
-        os.makedirs(output_path, exist_ok=True)
-
-        playlist = Playlist(url=f"{BaseURL.PLAYLIST.value}{album.playlist_id}")
-        for i, url in enumerate(playlist):
-            youtube = YouTube(url=url)
-
-            song = Song(
-                title=youtube.title,
-                artist=artist,
-                track_num=i + 1,
-                image_data=image_data,
-                filepath="",
-                album=album
+        song.outputs = [(filepath, profile) for filepath, (_, profile) in zip(filepaths, outputs)]
+        return song
+
+    def download_track(
+            self,
+            track: Track,
+            album: Album,
+            artist: str,
+            image_data: bytes,
+            output_path: str,
+            upcoming: Sequence[Track] = ()
+    ) -> Tuple[Song, Optional[str], Optional[Future]]:
+        self._prefetch_upcoming(track, upcoming)
+        song = self._make_song(track, album=album, artist=artist, image_data=image_data)
+        try:
+            song.outputs = self.get_outputs(
+                track.title, album=album, artist=artist, output_path=output_path
             )
+            song.filepath = self._download_song(song=song, output_path=output_path)
+        except DOWNLOAD_ERRORS as err:
+            self.metrics.set_error(song, err)
+            return song, _format_error(err), None
+        else:
+            with self.metrics.measure("transcode_wait", song):
+                transcode = self.transcoder.submit(song)
+            transcode.add_done_callback(lambda future: self._on_transcode_done(song, future))
+            return song, None, transcode
 
-            youtube.register_on_progress_callback(
-                lambda stream, _, bytes_remaining: self._on_progress_callback(
-                    song, bytes_remaining, stream
-                )
+    def _prefetch_upcoming(self, track: Track, upcoming: Sequence[Track]) -> None:
+        # Stream manifests of the next tracks are resolved while this
+        # one is transferring.
+        if self.prefetch:
+            position = next(
+                (i for i, item in enumerate(upcoming) if item is track), len(upcoming)
+            )
+            self.manifests.prefetch(
+                item.video_id for item in upcoming[position + 1:position + 1 + self.prefetch]
             )
-            youtube.register_on_complete_callback(
-                lambda _, filepath: self._on_complete_callback(
-                    song, 
-                    filepath  # type: ignore | another problem with pytubefix ?
+
+    def _make_song(
+            self,
+            track: Track,
+            album: Album,
+            artist: str,
+            image_data: bytes,
+            filepath: str = ""
+    ) -> Song:
+        return Song(
+            title=track.title,
+            artist=artist,
+            track_num=track.track_num,
+            image_data=image_data,
+            filepath=filepath,
+            album=album,
+            output_format=self.output_format,
+            video_id=track.video_id
+        )
+
+    def _on_transcode_stages(self, song: Song, stages: List[Tuple[str, float]]) -> None:
+        for stage, seconds in stages:
+            self.metrics.observe(stage, seconds, song)
+
+    def _on_transcode_done(self, song: Song, future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        song.filepath = future.result()
+        for filepath, profile in song.outputs or [(song.filepath, self.profiles[0])]:
+            self.ledger.add(
+                LedgerEntry(
+                    video_id=song.video_id,
+                    playlist_id=song.album.playlist_id,
+                    title=song.title,
+                    filepath=filepath,
+                    size=os.path.getsize(filepath),
+                    format=profile.key,
+                    completed_at=time.time()
                 )
             )
 
-            try:
-                self._download_song(youtube, output_path=output_path)
-            except (
-                    VideoUnavailable,
-                    IncompleteRead, 
-                    TimeoutError,
-                    EmptyStreamQuery,
-                    NoMP4StreamAvailable,
-                    HTTPError,
-                    URLError,
-                    RegexMatchError,
-                    KeyError # https://github.com/JuanBindez/pytubefix/issues/88
-            ) as err:
-                # built-in exceptions do not have __module__ attr.
-                if hasattr(err, "__module__"):
-                    error = f"{err.__module__}.{err.__class__.__name__}: {err}"
-                else:
-                    error = f"{err.__class__.__name__}: {err}"
-            else:
-                error = None
-
-            yield song, error
-
-    def _download_song(self, youtube: YouTube, output_path: str) -> None:
-        streams = youtube.streams
-        if not len(streams):
-            raise EmptyStreamQuery(f"The song '{youtube.title}' did not provide any data streams")
+    def get_transcode_result(self, song: Song, future: Future) -> Tuple[Song, Stage, Optional[str]]:
+        try:
+            future.result()
+        # Transcodes still queued at shutdown are cancelled.
+        except (EncoderError, TaggingError, OSError, BrokenProcessPool, CancelledError) as err:
+            self.metrics.set_error(song, err)
+            return song, Stage.TRANSCODE, _format_error(err)
         else:
-            stream = streams.get_audio_only(subtype="mp4")
-            if stream is None:
-                raise NoMP4StreamAvailable("Unexpected status: MP4 stream unavailable")
+            return song, Stage.TRANSCODE, None
 
-        stream.download(
-            output_path=output_path,
-            skip_existing=self.skip_existing,
+    def _select_stream(self, streams: StreamQuery) -> Optional[Stream]:
+        candidates = [
+            stream for stream in streams.filter(
+                only_audio=True, subtype=self.output_format.subtype
+            )
+            if stream.bitrate
+        ]
+        if not candidates:
+            return None
+        if self.max_bitrate is not None:
+            capped = [
+                stream for stream in candidates
+                if stream.bitrate <= self.max_bitrate * 1000
+            ]
+            if not capped:
+                return min(candidates, key=lambda stream: stream.bitrate)
+            candidates = capped
+        return max(candidates, key=lambda stream: stream.bitrate)
+
+    def _new_sizer(self) -> transfer.ChunkSizer:
+        return transfer.ChunkSizer(
+            initial=self.chunk_size,
+            min_size=self.min_chunk_size,
+            max_size=self.max_chunk_size
+        )
+
+    def _transfer_options(self, song: Song) -> Dict[str, Any]:
+        def on_throttle(delay: float) -> None:
+            self.metrics.add_throttle(song)
+            if self.on_throttle_callback is not None:
+                self.on_throttle_callback(song, delay)
+
+        return dict(
             timeout=self.timeout,
-            max_retries=self.max_retries
+            max_retries=self.max_retries,
+            sizer=self._new_sizer(),
+            limiter=self.rate_limiter,
+            backoff=self.backoff,
+            on_throttle=on_throttle,
+            on_retry=lambda _: self.metrics.add_retry(song)
+        )
+
+    def _get_progress_callback(self, song: Song, filesize: int) -> Callable[[int], None]:
+        # The first report of a transfer is the size of the resumed part.
+        last_received: Optional[int] = None
+
+        def on_progress(bytes_received: int) -> None:
+            nonlocal last_received
+            if last_received is not None:
+                self.metrics.add_bytes(song, bytes_received - last_received)
+            last_received = bytes_received
+            self.on_progress_callback(song, filesize, bytes_received)
+
+        return on_progress
+
+    def _resolve_streams(self, video_id: str) -> StreamQuery:
+        return YouTube(url=f"{BaseURL.WATCH.value}{video_id}").streams
+
+    def _get_stream(self, song: Song) -> Stream:
+        streams = self.manifests.get(song.video_id)
+        if not len(streams):
+            raise EmptyStreamQuery(f"The song '{song.title}' did not provide any data streams")
+        stream = self._select_stream(streams)
+        if stream is None:
+            subtype = self.output_format.subtype
+            if subtype == "mp4":
+                raise NoMP4StreamAvailable("Unexpected status: MP4 stream unavailable")
+            raise NoStreamAvailable(f"Unexpected status: {subtype.upper()} stream unavailable")
+        return stream
+
+    def _get_source_path(self, song: Song, output_path: str) -> str:
+        return os.path.join(
+            output_path, f"{sanitize_filename(song.title)}.{self.output_format.subtype}"
+        )
+
+    def _download_song(self, song: Song, output_path: str) -> str:
+        with self.metrics.measure("manifest", song):
+            stream = self._get_stream(song)
+        with self.host_limiter.acquire(stream.url), self.metrics.measure("transfer", song):
+            if self.streaming:
+                return self._stream_song(stream, song=song)
+
+            filepath = self._get_source_path(song, output_path)
+            if self.skip_existing and os.path.exists(filepath):
+                return filepath
+            return transfer.download(
+                stream.url,
+                filepath=filepath,
+                filesize=stream.filesize,
+                chunk_size=self.chunk_size,
+                on_progress=self._get_progress_callback(song, stream.filesize),
+                **self._transfer_options(song)
+            )
+
+    def _stream_song(self, stream: Stream, song: Song) -> str:
+        # The stream is piped straight into the encoder: no intermediate
+        # file is written and memory usage does not grow with track length.
+        def chunks() -> Generator:
+            on_progress = self._get_progress_callback(song, stream.filesize)
+            bytes_received = 0
+            on_progress(bytes_received)
+            for chunk in transfer.iter_range(
+                    stream.url,
+                    start=0,
+                    end=stream.filesize,
+                    chunk_size=self.chunk_size,
+                    **self._transfer_options(song)
+            ):
+                bytes_received += len(chunk)
+                on_progress(bytes_received)
+                yield chunk
+
+        encode_stream(
+            chunks(), song.outputs, source_subtype=self.output_format.subtype, song=song
         )
+        return song.outputs[0][0]
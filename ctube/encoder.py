@@ -0,0 +1,182 @@
+import os
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from pydub.utils import get_encoder_name
+from ctube.containers import Song
+from ctube.errors import EncoderError
+from ctube.formats import OutputProfile
+
+# Album types of the eyeD3 TXXX frame, still written for existing libraries.
+ALBUM_TYPES = ("lp", "ep", "compilation", "live", "various", "demo", "single")
+
+
+def get_tags(song: Song) -> Dict[str, str]:
+    album = song.album
+    tags = {
+        "title": song.title,
+        "artist": song.artist,
+        "track": str(song.track_num),
+        "album": album.title,
+        "date": str(album.release_year)
+    }
+    album_type = album.album_type.lower()
+    if album_type in ALBUM_TYPES:
+        tags["eyeD3#album_type"] = album_type
+    return tags
+
+
+def build_command(
+        outputs: Sequence[Tuple[str, OutputProfile]],
+        source: str = "pipe:0",
+        source_subtype: str = "mp4",
+        tags: Optional[Dict[str, str]] = None,
+        cover: Optional[str] = None
+) -> List[str]:
+    command = [
+        get_encoder_name(),
+        "-y",
+        "-loglevel", "error",
+        "-i", source
+    ]
+    if cover is not None:
+        command += ["-i", cover]
+    encoded = [
+        index for index, (_, profile) in enumerate(outputs)
+        if not profile.copies(source_subtype)
+    ]
+    if len(encoded) > 1:
+        # The source is decoded once, asplit hands the samples to
+        # every encoder. ffmpeg 7 and later run the encoders in
+        # parallel threads, earlier versions one after the other.
+        labels = "".join(f"[a{index}]" for index in encoded)
+        command += ["-filter_complex", f"[0:a]asplit={len(encoded)}{labels}"]
+
+    for index, (output, profile) in enumerate(outputs):
+        fmt = profile.output_format
+        command += ["-map", f"[a{index}]" if len(encoded) > 1 and index in encoded else "0:a"]
+        if profile.copies(source_subtype):
+            command += ["-c:a", "copy"]
+        else:
+            command += ["-c:a", fmt.codec]
+            if profile.bitrate is not None:
+                command += ["-b:a", f"{profile.bitrate}k"]
+            if profile.sample_rate is not None:
+                command += ["-ar", str(profile.sample_rate)]
+        if fmt.encoder_tags and tags is not None:
+            if cover is not None:
+                # The cover is muxed as an attached picture (APIC), copied as is.
+                command += [
+                    "-map", "1:0",
+                    "-c:v", "copy",
+                    "-metadata:s:v", "title=cover",
+                    "-metadata:s:v", "comment=Cover (front)"
+                ]
+            for key, value in tags.items():
+                command += ["-metadata", f"{key}={value}"]
+        command += ["-f", fmt.muxer, output]
+    return command
+
+
+@contextmanager
+def _encoder_command(
+        outputs: Sequence[Tuple[str, OutputProfile]],
+        source: str,
+        source_subtype: str,
+        song: Optional[Song]
+) -> Iterator[List[str]]:
+    # Formats whose tags are written by the encoder get them, with the
+    # cover, in the same pass: each output file is written only once.
+    tagged = song is not None and any(
+        profile.output_format.encoder_tags for _, profile in outputs
+    )
+    if song is None or not tagged:
+        yield build_command(outputs, source=source, source_subtype=source_subtype)
+    elif not song.image_data:
+        yield build_command(
+            outputs, source=source, source_subtype=source_subtype, tags=get_tags(song)
+        )
+    else:
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as cover:
+            cover.write(song.image_data)
+            cover.flush()
+            yield build_command(
+                outputs,
+                source=source,
+                source_subtype=source_subtype,
+                tags=get_tags(song),
+                cover=cover.name
+            )
+
+
+def _make_directories(outputs: Sequence[Tuple[str, OutputProfile]]) -> None:
+    for output, _ in outputs:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+
+
+def _remove_outputs(outputs: Sequence[Tuple[str, OutputProfile]]) -> None:
+    for output, _ in outputs:
+        if os.path.exists(output):
+            os.remove(output)
+
+
+def encode_file(
+        source: str,
+        outputs: Sequence[Tuple[str, OutputProfile]],
+        source_subtype: str = "mp4",
+        song: Optional[Song] = None
+) -> None:
+    _make_directories(outputs)
+    with _encoder_command(
+            outputs, source=source, source_subtype=source_subtype, song=song
+    ) as command:
+        process = subprocess.run(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+    if process.returncode != 0:
+        _remove_outputs(outputs)
+        raise EncoderError(process.stderr.decode(errors="replace").strip())
+
+
+def encode_stream(
+        chunks: Iterable[bytes],
+        outputs: Sequence[Tuple[str, OutputProfile]],
+        source_subtype: str = "mp4",
+        song: Optional[Song] = None
+) -> None:
+    _make_directories(outputs)
+    # stderr goes to a file rather than a pipe so that a chatty encoder
+    # can never block while we are feeding its stdin.
+    with tempfile.TemporaryFile() as stderr, _encoder_command(
+            outputs, source="pipe:0", source_subtype=source_subtype, song=song
+    ) as command:
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=stderr
+        )
+        assert process.stdin is not None
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            pass  # the encoder exited early, the return code tells why
+        except BaseException:
+            process.kill()
+            process.wait()
+            _remove_outputs(outputs)
+            raise
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+        if process.wait() != 0:
+            stderr.seek(0)
+            _remove_outputs(outputs)
+            raise EncoderError(stderr.read().decode(errors="replace").strip())
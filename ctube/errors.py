@@ -8,9 +8,42 @@ class InvalidIndexSyntax(CTubeError):
         to the 'download' command with invalid syntax."""
 
 
-class NoMP4StreamAvailable(CTubeError):
+class NoStreamAvailable(CTubeError):
+    """Occurs when no audio stream matches the requested output format."""
+
+
+class NoMP4StreamAvailable(NoStreamAvailable):
     """ Occurs when no stream with subtype mp4 is available. """
 
 
 class EmptyStreamQuery(CTubeError):
     """This occurs when there are no streams for a song."""
+
+
+class EncoderError(CTubeError):
+    """Occurs when the encoder process exits with an error."""
+
+
+class TaggingError(CTubeError):
+    """Occurs when the tags of an output file can't be written."""
+
+
+class TransferError(CTubeError):
+    """ctube base exception for stream transfers."""
+
+
+class TransferInterrupted(TransferError):
+    """Occurs when a transfer is stopped before completion.
+       The partial file is kept so the transfer can be resumed."""
+
+
+class IncompleteTransfer(TransferError):
+    """Occurs when the received data does not match the stream size."""
+
+
+class UnexpectedRange(TransferError):
+    """Occurs when a range request is not answered with the requested bytes."""
+
+
+class CassetteMiss(CTubeError):
+    """Occurs when a replayed session makes a call missing from the cassette."""
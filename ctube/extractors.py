@@ -1,5 +1,5 @@
-from typing import Dict, List, Tuple
-from ctube.containers import Album
+from typing import Any, Dict, Generator, List, Optional
+from ctube.containers import Album, Track
 
 
 def extract_artist_id(data: Dict) -> str:
@@ -9,33 +9,133 @@ def extract_artist_id(data: Dict) -> str:
         "navigationEndpoint"]["browseEndpoint"]["browseId"]
 
 
-def extract_albums(data: Dict) -> Tuple[List[Album], str]:
-    albums: List[Album] = []
-    for item in data["contents"]["singleColumnBrowseResultsRenderer"]["tabs"][0][
+def extract_artist_name(data: Dict) -> str:
+    return data["header"]["musicHeaderRenderer"]["title"]["runs"][0]["text"]
+
+
+def iter_albums(client: Any, data: Dict) -> Generator[Album, None, None]:
+    """Yields the albums of a browse response page by page, following
+       continuations. Only one page is held in memory at a time."""
+    page = _extract_grid(data)
+    while True:
+        continuation: Optional[str] = None
+        for item in page["items"]:
+            if "musicTwoRowItemRenderer" in item:
+                yield _extract_album(item)
+            elif "continuationItemRenderer" in item:
+                continuation = item["continuationItemRenderer"][
+                    "continuationEndpoint"]["continuationCommand"]["token"]
+        if continuation is None and page.get("continuations"):
+            continuation = page["continuations"][0][
+                "nextContinuationData"]["continuation"]
+        if continuation is None:
+            return
+        page = _extract_continuation_page(client.browse(continuation=continuation))
+
+
+def _extract_grid(data: Dict) -> Dict:
+    return data["contents"]["singleColumnBrowseResultsRenderer"]["tabs"][0][
         "tabRenderer"]["content"]["sectionListRenderer"]["contents"][
-            0]["gridRenderer"]["items"]:
-
-        item_data = item["musicTwoRowItemRenderer"]
-        album_type = item_data["subtitle"]["runs"][0]["text"]
-        title = item_data["title"]["runs"][0]["text"]
-        release_year = int(item_data["subtitle"]["runs"][-1]["text"])
-        thumbnail_url = item_data["thumbnailRenderer"][
-            "musicThumbnailRenderer"]["thumbnail"][
-            "thumbnails"][-1]["url"]
-        playlist_id = item_data["menu"]["menuRenderer"]["items"][
-            0]["menuNavigationItemRenderer"]["navigationEndpoint"][
-            "watchPlaylistEndpoint"]["playlistId"]
-        albums.append(
-            Album(
-                title=title, 
-                album_type=album_type,
-                release_year=release_year,
-                thumbnail_url=thumbnail_url,
-                playlist_id=playlist_id
+            0]["gridRenderer"]
+
+
+def _extract_continuation_page(data: Dict) -> Dict:
+    if "continuationContents" in data:
+        return data["continuationContents"]["gridContinuation"]
+    return {
+        "items": data["onResponseReceivedActions"][0][
+            "appendContinuationItemsAction"]["continuationItems"]
+    }
+
+
+def _extract_album(item: Dict) -> Album:
+    item_data = item["musicTwoRowItemRenderer"]
+    album_type = item_data["subtitle"]["runs"][0]["text"]
+    title = item_data["title"]["runs"][0]["text"]
+    release_year = int(item_data["subtitle"]["runs"][-1]["text"])
+    thumbnail_url = item_data["thumbnailRenderer"][
+        "musicThumbnailRenderer"]["thumbnail"][
+        "thumbnails"][-1]["url"]
+    playlist_id = item_data["menu"]["menuRenderer"]["items"][
+        0]["menuNavigationItemRenderer"]["navigationEndpoint"][
+        "watchPlaylistEndpoint"]["playlistId"]
+    return Album(
+        title=title, 
+        album_type=album_type,
+        release_year=release_year,
+        thumbnail_url=thumbnail_url,
+        playlist_id=playlist_id
+    )
+
+
+def extract_tracks(client: Any, data: Dict) -> List[Track]:
+    """Returns the tracks of a VL browse response, following
+       continuations."""
+    contents = data["contents"]
+    if "twoColumnBrowseResultsRenderer" in contents:
+        section_list = contents["twoColumnBrowseResultsRenderer"][
+            "secondaryContents"]["sectionListRenderer"]
+    else:
+        section_list = contents["singleColumnBrowseResultsRenderer"]["tabs"][0][
+            "tabRenderer"]["content"]["sectionListRenderer"]
+    shelf = section_list["contents"][0]
+    shelf = shelf.get("musicPlaylistShelfRenderer") or shelf["musicShelfRenderer"]
+
+    tracks: List[Track] = []
+    track_num = 0
+    while True:
+        continuation: Optional[str] = None
+        for item in shelf["contents"]:
+            if "continuationItemRenderer" in item:
+                continuation = item["continuationItemRenderer"][
+                    "continuationEndpoint"]["continuationCommand"]["token"]
+                continue
+            track_num += 1
+            item_data = item["musicResponsiveListItemRenderer"]
+            if "playlistItemData" not in item_data:
+                continue  # unavailable track, keeps its position in the numbering
+            title = item_data["flexColumns"][0]["musicResponsiveListItemFlexColumnRenderer"][
+                "text"]["runs"][0]["text"]
+            tracks.append(
+                Track(
+                    video_id=item_data["playlistItemData"]["videoId"],
+                    title=title,
+                    duration=_extract_duration(item_data),
+                    track_num=track_num
+                )
             )
+        if continuation is None and shelf.get("continuations"):
+            continuation = shelf["continuations"][0][
+                "nextContinuationData"]["continuation"]
+        if continuation is None:
+            return tracks
+        shelf = _extract_shelf_continuation(client.browse(continuation=continuation))
+
+
+def _extract_shelf_continuation(data: Dict) -> Dict:
+    if "continuationContents" in data:
+        return data["continuationContents"]["musicPlaylistShelfContinuation"]
+    return {
+        "contents": data["onResponseReceivedActions"][0][
+            "appendContinuationItemsAction"]["continuationItems"]
+    }
+
+
+def _extract_duration(item_data: Dict) -> Optional[int]:
+    try:
+        return _parse_duration(
+            item_data["fixedColumns"][0]["musicResponsiveListItemFixedColumnRenderer"][
+                "text"]["runs"][0]["text"]
         )
-    return albums, data["header"][
-        "musicHeaderRenderer"]["title"]["runs"][0]["text"]
+    except (KeyError, IndexError, ValueError):
+        return None  # not listed, e.g. for some uploads
+
+
+def _parse_duration(duration: str) -> int:
+    seconds = 0
+    for part in duration.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
 
 
 def extract_search_suggestions(data: Dict) -> List[str]:
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+
+# Fields of OutputProfile.directory templates.
+DIRECTORY_FIELDS = ("artist", "album", "album_type", "year", "format", "bitrate")
+DEFAULT_DIRECTORY = "{artist}/{album}"
+
+
+class OutputFormat(str, Enum):
+    MP3 = "mp3"
+    M4A = "m4a"
+    OPUS = "opus"
+
+    @property
+    def subtype(self) -> str:
+        """Subtype of the source stream the format is produced from."""
+        return "webm" if self is OutputFormat.OPUS else "mp4"
+
+    @property
+    def muxer(self) -> str:
+        return "ipod" if self is OutputFormat.M4A else self.value
+
+    @property
+    def codec(self) -> str:
+        return {"mp3": "libmp3lame", "m4a": "aac", "opus": "libopus"}[self.value]
+
+    @property
+    def stream_copy(self) -> bool:
+        """Whether the source codec is kept (remux only, no re-encoding)."""
+        return self is not OutputFormat.MP3
+
+    @property
+    def encoder_tags(self) -> bool:
+        """Whether tags and cover are written by the encoder, while encoding."""
+        return self is OutputFormat.MP3
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    """One of the files produced from every downloaded song.
+
+    directory is a path template relative to the output path, see
+    DIRECTORY_FIELDS. Without bitrate and sample_rate, the M4A and
+    Opus profiles keep the source codec when it matches theirs."""
+    output_format: OutputFormat = OutputFormat.MP3
+    bitrate: Optional[int] = None  # kbps, the encoder's default when None
+    sample_rate: Optional[int] = None  # Hz, the source's when None
+    directory: str = DEFAULT_DIRECTORY
+
+    def __post_init__(self):
+        try:
+            self.directory.format(**{name: "" for name in DIRECTORY_FIELDS})
+        except (KeyError, IndexError, ValueError) as err:
+            raise ValueError(f"Invalid directory template '{self.directory}': {err}")
+
+    @property
+    def key(self) -> str:
+        """Identifies the profile's outputs in the ledger."""
+        if (self.bitrate, self.sample_rate, self.directory) == (None, None, DEFAULT_DIRECTORY):
+            return self.output_format.value
+        return f"{self.output_format.value}:{self.bitrate or ''}:{self.sample_rate or ''}:{self.directory}"
+
+    def copies(self, source_subtype: str) -> bool:
+        """Whether the profile is a remux of a source of this subtype."""
+        return (
+            self.output_format.stream_copy
+            and self.output_format.subtype == source_subtype
+            and self.bitrate is None
+            and self.sample_rate is None
+        )
+
+
+def parse_profile(spec: str) -> OutputProfile:
+    """Parses 'format[:bitrate[:sample_rate[:directory]]]', e.g.
+       'opus:64k:48000:previews/{artist}/{album}'."""
+    fields = spec.split(":", 3)
+    fields += [""] * (4 - len(fields))
+    output_format, bitrate, sample_rate, directory = fields
+    return OutputProfile(
+        output_format=OutputFormat(output_format.lower()),
+        bitrate=int(bitrate.lower().rstrip("k")) if bitrate else None,
+        sample_rate=int(sample_rate) if sample_rate else None,
+        directory=directory or DEFAULT_DIRECTORY
+    )
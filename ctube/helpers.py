@@ -1,14 +1,13 @@
 import re
-import requests
-from typing import List , Callable, Dict
+import time
+from typing import List , Callable, Dict, Optional
 from urllib.error import URLError
-from httpx import ReadTimeout, ConnectTimeout, ConnectError
-from innertube.errors import RequestError
 from ctube.containers import Album
 from ctube.errors import InvalidIndexSyntax
 from ctube.parser import parse_indexes
 from ctube.colors import Color
 from ctube.printers import write
+from ctube.transport import get_session
 
 
 def filter_albums_by_indexes(albums: List[Album], user_input: str) -> List[Album]:
@@ -49,22 +48,57 @@ def filter_albums_by_regex(albums: List[Album], pattern: str) -> Dict[int, Album
     return filtered_albums
 
 
-def handle_connection_errors(func: Callable) -> Callable:
+# Connectivity as last observed, either by a probe or by a real request.
+_online: Optional[bool] = None
+_checked_at = 0.0
+
+
+def report_connection(online: bool) -> None:
+    global _online, _checked_at
+    _online, _checked_at = online, time.monotonic()
+
+
+def handle_connection_errors(
+        func: Callable,
+        report: Optional[Callable[[str], None]] = None
+) -> Callable:
+    """Reports connection errors of func through report, on stdout by
+       default, and returns None instead of raising them."""
+    if report is None:
+        report = lambda message: write(message, Color.RED)
+
     def inner(*args, **kwargs):
+        # Imported here: httpx and innertube are only needed once a
+        # network command runs.
+        from httpx import ReadTimeout, ConnectTimeout, ConnectError
+        from innertube.errors import RequestError
         try:
-            return func(*args, **kwargs)
+            result = func(*args, **kwargs)
         except RequestError:
-            write("Invalid request", Color.RED)
+            report("Invalid request")
         except (ConnectTimeout, ReadTimeout):
-            write("A timeout error occurred. Try again.", Color.RED)
+            report("A timeout error occurred. Try again.")
         except (ConnectError, URLError):
-            write("No internet connection", Color.RED)
+            report_connection(False)
+            report("No internet connection")
+        else:
+            report_connection(True)
+            return result
     return inner
 
 
-def connected_to_internet(url: str = 'http://www.google.com/', timeout: int = 5) -> bool:
+def connected_to_internet(
+        url: str = 'http://www.google.com/',
+        timeout: int = 5,
+        ttl: float = 60
+) -> bool:
+    # The probe is only sent when nothing was observed in the last ttl seconds.
+    if _online is not None and time.monotonic() - _checked_at < ttl:
+        return _online
+    import requests
     try:
-        _ = requests.head(url, timeout=timeout)
-        return True
+        _ = get_session().head(url, timeout=timeout)
+        report_connection(True)
     except requests.ConnectionError:
-        return False
+        report_connection(False)
+    return bool(_online)
@@ -0,0 +1,73 @@
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class LedgerEntry:
+    video_id: str
+    playlist_id: str
+    title: str
+    filepath: str
+    size: int
+    format: str
+    completed_at: float
+
+
+class Ledger:
+    def __init__(self, path: str):
+        self.path = path
+        # The ledger is shared by the download threads, access is serialized.
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                "video_id TEXT NOT NULL, "
+                "playlist_id TEXT NOT NULL, "
+                "title TEXT NOT NULL, "
+                "filepath TEXT NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "format TEXT NOT NULL, "
+                "completed_at REAL NOT NULL, "
+                "PRIMARY KEY (video_id, playlist_id, format))"
+            )
+
+    def get(self, video_id: str, playlist_id: str, format: str) -> Optional[LedgerEntry]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT video_id, playlist_id, title, filepath, size, format, completed_at "
+                "FROM downloads WHERE video_id = ? AND playlist_id = ? AND format = ?",
+                (video_id, playlist_id, format)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = LedgerEntry(*row)
+        # Entries whose file was deleted or modified are stale.
+        try:
+            if os.path.getsize(entry.filepath) != entry.size:
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def add(self, entry: LedgerEntry) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.video_id,
+                    entry.playlist_id,
+                    entry.title,
+                    entry.filepath,
+                    entry.size,
+                    entry.format,
+                    entry.completed_at
+                )
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,107 @@
+import time
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlparse
+
+
+class HostLimiter:
+    def __init__(self, max_connections: Optional[int] = None):
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.Semaphore] = {}
+
+    def _get_semaphore(self, host: str) -> threading.Semaphore:
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.Semaphore(self.max_connections)
+            return self._semaphores[host]
+
+    @contextmanager
+    def acquire(self, url: str) -> Iterator[None]:
+        if self.max_connections is None:
+            yield
+        else:
+            semaphore = self._get_semaphore(urlparse(url).netloc)
+            with semaphore:
+                yield
+
+
+class TokenBucket:
+    """Caps the rate of a shared resource, e.g. bytes per second.
+
+    Callers reserve what they used and wait the returned delay, so the
+    bucket can be shared by any number of threads without blocking them
+    under its lock.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self._lock = threading.Lock()
+        self._tokens = self.burst or 0.0
+        self._updated_at = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """Takes amount tokens and returns how long to wait before using them."""
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._tokens + (now - self._updated_at) * self.rate, self.burst
+            )
+            self._updated_at = now
+            self._tokens -= amount
+            return max(-self._tokens / self.rate, 0.0)
+
+
+@dataclass
+class _HostState:
+    interval: float = 0.0
+    next_at: float = 0.0
+
+
+class HostBackoff:
+    """Spaces out requests to hosts that throttled us (HTTP 429/403).
+
+    Each throttled response doubles the interval between requests to
+    that host, up to max_delay; successful ones halve it again.
+    """
+
+    def __init__(self, base_delay: float = 1.0, max_delay: float = 60.0, max_retries: int = 5):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, _HostState] = {}
+
+    def _get_state(self, url: str) -> _HostState:
+        return self._hosts.setdefault(urlparse(url).netloc, _HostState())
+
+    def reserve(self, url: str) -> float:
+        """Returns how long to wait before sending a request to url."""
+        with self._lock:
+            state = self._get_state(url)
+            now = time.monotonic()
+            start = max(state.next_at, now)
+            state.next_at = start + state.interval
+            return start - now
+
+    def throttled(self, url: str, retry_after: Optional[float] = None) -> float:
+        """Records a throttled response and returns the delay before retrying."""
+        with self._lock:
+            state = self._get_state(url)
+            state.interval = min(max(state.interval * 2, self.base_delay), self.max_delay)
+            delay = state.interval if retry_after is None else min(retry_after, self.max_delay)
+            now = time.monotonic()
+            state.next_at = max(state.next_at, now + delay)
+            return state.next_at - now
+
+    def succeeded(self, url: str) -> None:
+        with self._lock:
+            state = self._get_state(url)
+            state.interval /= 2
+            if state.interval < self.base_delay / 4:
+                state.interval = 0.0
@@ -0,0 +1,68 @@
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Set, Tuple
+from pytubefix import StreamQuery
+
+
+def _get_expiration(streams: StreamQuery) -> float:
+    expirations = []
+    for stream in streams:
+        try:
+            expirations.append(stream.expiration.timestamp())
+        except (KeyError, IndexError, ValueError):
+            pass
+    return min(expirations, default=float("inf"))
+
+
+class ManifestCache:
+    def __init__(
+            self,
+            resolve: Callable[[str], StreamQuery],
+            max_entries: int = 8,
+            max_workers: int = 2,
+            margin: int = 60
+    ):
+        self.resolve = resolve
+        self.max_entries = max_entries
+        self.margin = margin  # seconds a stream URL must still be valid for
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Future]" = OrderedDict()
+        # Videos being resolved by get(), not worth prefetching.
+        self._claimed: Set[str] = set()
+
+    def _resolve(self, video_id: str) -> Tuple[StreamQuery, float]:
+        streams = self.resolve(video_id)
+        return streams, _get_expiration(streams)
+
+    def prefetch(self, video_ids: Iterable[str]) -> None:
+        with self._lock:
+            for video_id in video_ids:
+                if video_id not in self._entries and video_id not in self._claimed:
+                    self._entries[video_id] = self._executor.submit(self._resolve, video_id)
+            while len(self._entries) > self.max_entries:
+                _, future = self._entries.popitem(last=False)
+                future.cancel()
+
+    def get(self, video_id: str) -> StreamQuery:
+        with self._lock:
+            self._claimed.add(video_id)
+            future = self._entries.pop(video_id, None)
+        try:
+            if future is not None and not future.cancelled():
+                try:
+                    streams, expiration = future.result()
+                except Exception:
+                    pass  # prefetch failed, try again below
+                else:
+                    if expiration - self.margin > time.time():
+                        return streams
+            return self.resolve(video_id)
+        finally:
+            with self._lock:
+                self._claimed.discard(video_id)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
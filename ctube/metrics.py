@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from ctube.containers import Song
+
+
+# Stage durations measured in the current process, e.g. by the
+# callbacks in a Transcoder worker, until collected.
+_stages: List[Tuple[str, float]] = []
+
+
+@contextmanager
+def record_stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stages.append((name, time.perf_counter() - started))
+
+
+def collect_stages() -> List[Tuple[str, float]]:
+    stages = _stages[:]
+    del _stages[:]
+    return stages
+
+
+@dataclass
+class TrackMetrics:
+    video_id: str
+    title: str
+    playlist_id: str
+    stages: Dict[str, float] = field(default_factory=dict)  # seconds
+    bytes: int = 0
+    retries: int = 0
+    throttles: int = 0
+    error: Optional[str] = None
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    values = sorted(values)
+    index = min(int(round(percent / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomic(filepath: str, content: str) -> None:
+    # node_exporter may read the file at any time, never let it see half of it.
+    tmp_filepath = f"{filepath}.tmp"
+    with open(tmp_filepath, "w") as file:
+        file.write(content)
+    os.replace(tmp_filepath, filepath)
+
+
+class Metrics:
+    """Collects per-track stage durations, bytes, retries and errors
+       of a download session."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._tracks: Dict[Tuple[str, str], TrackMetrics] = {}
+        self._samples: Dict[str, List[float]] = {}
+
+    def _get_track(self, song: Song) -> TrackMetrics:
+        key = (song.album.playlist_id, song.video_id)
+        if key not in self._tracks:
+            self._tracks[key] = TrackMetrics(
+                video_id=song.video_id, title=song.title, playlist_id=song.album.playlist_id
+            )
+        return self._tracks[key]
+
+    def observe(self, stage: str, seconds: float, song: Optional[Song] = None) -> None:
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+            if song is not None:
+                stages = self._get_track(song).stages
+                stages[stage] = stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def measure(self, stage: str, song: Optional[Song] = None) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started, song)
+
+    def add_bytes(self, song: Song, size: int) -> None:
+        with self._lock:
+            self._get_track(song).bytes += size
+
+    def add_retry(self, song: Song) -> None:
+        with self._lock:
+            self._get_track(song).retries += 1
+
+    def add_throttle(self, song: Song) -> None:
+        with self._lock:
+            self._get_track(song).throttles += 1
+
+    def set_error(self, song: Song, error: BaseException) -> None:
+        with self._lock:
+            self._get_track(song).error = error.__class__.__name__
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            tracks = [asdict(track) for track in self._tracks.values()]
+            samples = {stage: values[:] for stage, values in self._samples.items()}
+
+        duration = time.time() - self.started_at
+        total_bytes = sum(track["bytes"] for track in tracks)
+        errors: Dict[str, int] = {}
+        for track in tracks:
+            transfer_time = track["stages"].get("transfer")
+            track["throughput"] = track["bytes"] / transfer_time if transfer_time else None
+            if track["error"]:
+                errors[track["error"]] = errors.get(track["error"], 0) + 1
+        return {
+            "started_at": self.started_at,
+            "duration": duration,
+            "tracks": len(tracks),
+            "failed": sum(track["error"] is not None for track in tracks),
+            "bytes": total_bytes,
+            "throughput": total_bytes / duration if duration else None,
+            "retries": sum(track["retries"] for track in tracks),
+            "throttles": sum(track["throttles"] for track in tracks),
+            "errors": errors,
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "total": sum(values),
+                    "mean": sum(values) / len(values),
+                    "p50": _percentile(values, 50),
+                    "p95": _percentile(values, 95),
+                    "max": max(values)
+                }
+                for stage, values in samples.items() if values
+            },
+            "per_track": tracks
+        }
+
+    def write_json(self, filepath: str) -> None:
+        _write_atomic(filepath, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, filepath: str, prefix: str = "ctube") -> None:
+        """Writes the report in the textfile format of node_exporter."""
+        report = self.report()
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Time spent per pipeline stage.",
+            f"# TYPE {prefix}_stage_duration_seconds summary",
+        ]
+        for stage, stats in report["stages"].items():
+            stage = _escape(stage)
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95")):
+                lines.append(
+                    f'{prefix}_stage_duration_seconds{{stage="{stage}",quantile="{quantile}"}} {stats[key]}'
+                )
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{stage}"}} {stats["total"]}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{stage}"}} {stats["count"]}')
+
+        lines += [
+            f"# HELP {prefix}_tracks_total Tracks processed in the session.",
+            f"# TYPE {prefix}_tracks_total counter",
+            f'{prefix}_tracks_total{{status="ok"}} {report["tracks"] - report["failed"]}',
+            f'{prefix}_tracks_total{{status="failed"}} {report["failed"]}',
+            f"# HELP {prefix}_errors_total Failed tracks by error class.",
+            f"# TYPE {prefix}_errors_total counter",
+        ]
+        lines += [
+            f'{prefix}_errors_total{{class="{_escape(name)}"}} {count}'
+            for name, count in report["errors"].items()
+        ]
+        for name, help_text, value in (
+                ("bytes_total", "Bytes received from stream servers.", report["bytes"]),
+                ("retries_total", "Range requests retried after a connection error.", report["retries"]),
+                ("throttles_total", "Range requests throttled by the server.", report["throttles"]),
+        ):
+            lines += [
+                f"# HELP {prefix}_{name} {help_text}",
+                f"# TYPE {prefix}_{name} counter",
+                f"{prefix}_{name} {value}",
+            ]
+        lines += [
+            f"# HELP {prefix}_session_duration_seconds Duration of the session.",
+            f"# TYPE {prefix}_session_duration_seconds gauge",
+            f"{prefix}_session_duration_seconds {report['duration']}",
+            f"# HELP {prefix}_session_start_time_seconds Start of the session.",
+            f"# TYPE {prefix}_session_start_time_seconds gauge",
+            f"{prefix}_session_start_time_seconds {report['started_at']}",
+        ]
+        _write_atomic(filepath, "\n".join(lines) + "\n")
@@ -3,3 +3,4 @@ import os
 
 HOME = os.path.expanduser("~")
 MUSIC = os.path.join(HOME, "Music")
+CACHE = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(HOME, ".cache")), "ctube")
@@ -30,6 +30,11 @@ def print_albums_list(albums: List[Album]) -> None:
         _print_album_title(i, album.title, title_space, max_index_len)
 
 
+def print_album(index: int, album: Album, max_index_len: int = 3) -> None:
+    title_space = _get_title_space(max_index_len)
+    _print_album_title(index, album.title, title_space, max_index_len)
+
+
 def print_albums_dict(albums: Dict[int, Album]) -> None:
     max_index_len = len(str(max(albums.keys())))
     title_space = _get_title_space(max_index_len)
@@ -0,0 +1,220 @@
+import sys
+import time
+import shutil
+import threading
+from collections import deque
+from dataclasses import dataclass, field, replace
+from typing import Deque, Dict, List, Optional, TextIO, Tuple
+from ctube.colors import Color, color
+from ctube.containers import Song
+
+
+@dataclass
+class _Bar:
+    title: str
+    filesize: int
+    received: int = 0
+    resumed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    note: str = ""
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02}:{seconds:02}"
+    return f"{minutes}:{seconds:02}"
+
+
+class ProgressRenderer:
+    """Draws the progress of concurrent downloads at a fixed frame rate.
+
+    update() only records the state of a transfer, the drawing happens in
+    a separate thread, so the cost on the download path does not depend
+    on the number of progress events. When the stream is not a terminal,
+    a summary line is logged every log_interval seconds instead.
+
+    _lock guards the state of the transfers and is never held while
+    writing, _output_lock serializes the writes to the stream.
+    """
+
+    def __init__(
+            self,
+            fps: float = 10,
+            stream: TextIO = sys.stdout,
+            interactive: Optional[bool] = None,
+            log_interval: float = 5.0,
+            max_bars: int = 8,
+            rate_window: float = 5.0
+    ):
+        self.fps = fps
+        self.stream = stream
+        self.interactive = stream.isatty() if interactive is None else interactive
+        self.log_interval = log_interval
+        self.max_bars = max_bars
+        self.rate_window = rate_window
+        self._lock = threading.Lock()
+        self._output_lock = threading.Lock()
+        self._bars: Dict[Tuple[str, str], _Bar] = {}
+        self._samples: Deque[Tuple[float, int]] = deque()
+        self._received = 0
+        self._completed = 0
+        self._started_at = 0.0
+        self._drawn = 0  # lines of the last frame
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _key(song: Song) -> Tuple[str, str]:
+        return song.album.playlist_id, song.video_id or song.title
+
+    def update(self, song: Song, filesize: int, bytes_received: int) -> None:
+        """on_progress_callback of the Downloader."""
+        with self._lock:
+            key = self._key(song)
+            bar = self._bars.get(key)
+            if bar is None:
+                # Bytes of a resumed transfer are not part of this session.
+                bar = self._bars[key] = _Bar(
+                    title=song.title,
+                    filesize=filesize,
+                    received=bytes_received,
+                    resumed=bytes_received
+                )
+            self._received += bytes_received - bar.received
+            bar.received = bytes_received
+            bar.note = ""
+            if filesize and bytes_received >= filesize:
+                del self._bars[key]
+                self._completed += 1
+
+    def throttled(self, song: Song, delay: float) -> None:
+        """on_throttle_callback of the Downloader."""
+        with self._lock:
+            bar = self._bars.get(self._key(song))
+            if bar is not None:
+                bar.note = f"throttled, retry in {delay:.0f}s"
+                return
+        self.write(f":: Throttled: {song.title}, retry in {delay:.0f}s", Color.YELLOW)
+
+    def remove(self, song: Song) -> None:
+        with self._lock:
+            self._bars.pop(self._key(song), None)
+
+    def write(self, string: str, col: Color = Color.WHITE) -> None:
+        """Prints a line above the progress bars."""
+        with self._output_lock:
+            self._clear()
+            self.stream.write(f"{color(string, col=col)}\n")
+            self.stream.flush()
+
+    def start(self) -> None:
+        with self._lock:
+            self._bars.clear()
+            self._samples.clear()
+            self._received = self._completed = 0
+            self._started_at = time.monotonic()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            received = self._received
+            elapsed = time.monotonic() - self._started_at
+        with self._output_lock:
+            self._clear()
+            if received:
+                self.stream.write(color(
+                    f":: Received {_format_size(received)} in {_format_duration(elapsed)}"
+                    f" ({_format_size(received / max(elapsed, 1e-3))}/s)",
+                    Color.BLUE
+                ) + "\n")
+            self.stream.flush()
+
+    def __enter__(self) -> "ProgressRenderer":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        interval = 1 / self.fps if self.interactive else self.log_interval
+        while not self._stopped.wait(interval):
+            # The frame is drawn from a copy, so a slow stream never
+            # blocks update().
+            with self._lock:
+                if not self.interactive and not self._bars:
+                    continue
+                bars = [replace(bar) for bar in list(self._bars.values())[:self.max_bars]]
+                summary = self._summary()
+            with self._output_lock:
+                if self.interactive:
+                    self._draw(bars, summary)
+                else:
+                    self.stream.write(f"{summary}\n")
+                    self.stream.flush()
+
+    def _rate(self) -> float:
+        now = time.monotonic()
+        self._samples.append((now, self._received))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.rate_window:
+            self._samples.popleft()
+        start, received = self._samples[0]
+        return (self._received - received) / (now - start) if now > start else 0.0
+
+    def _summary(self) -> str:
+        rate = self._rate()
+        remaining = sum(bar.filesize - bar.received for bar in self._bars.values())
+        eta = _format_duration(remaining / rate) if rate else "--:--"
+        hidden = len(self._bars) - self.max_bars
+        return (
+            f":: {len(self._bars)} active{f' ({hidden} hidden)' if hidden > 0 else ''},"
+            f" {self._completed} done | {_format_size(self._received)}"
+            f" | {_format_size(rate)}/s | ETA {eta}"
+        )
+
+    def _format_bar(self, bar: _Bar, columns: int) -> str:
+        percent = 100.0 * bar.received / bar.filesize if bar.filesize else 0.0
+        elapsed = time.monotonic() - bar.started_at
+        rate = (bar.received - bar.resumed) / max(elapsed, 1e-3)
+        status = bar.note or f"{_format_size(rate)}/s"
+        width = max(int(columns * 0.25), 10)
+        filled = int(width * percent / 100)
+        suffix = f" [{'#' * filled}{'-' * (width - filled)}] {percent:5.1f}% {status}"
+        title_space = columns - len(suffix) - 4
+        title = bar.title
+        if len(title) > title_space:
+            title = f"{title[:max(title_space - 3, 0)]}..."
+        return f":: {title.ljust(max(title_space, 0))}{suffix}"
+
+    def _draw(self, bars: List[_Bar], summary: str) -> None:
+        # Lines are cut to the terminal width: a wrapped line would break
+        # the cursor arithmetic of the next frame.
+        columns = shutil.get_terminal_size().columns - 1
+        lines: List[str] = [self._format_bar(bar, columns)[:columns] for bar in bars]
+        lines.append(color(summary[:columns], Color.BLUE))
+        frame = f"\033[{self._drawn}F" if self._drawn else ""
+        frame += "".join(f"\033[2K{line}\n" for line in lines) + "\033[J"
+        self.stream.write(frame)
+        self.stream.flush()
+        self._drawn = len(lines)
+
+    def _clear(self) -> None:
+        if self._drawn:
+            self.stream.write(f"\033[{self._drawn}F\033[J")
+            self._drawn = 0
@@ -0,0 +1,139 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, Generator, List, Optional, Tuple
+from ctube.containers import Album, Job, Song, Stage, Track
+from ctube.download import ALBUM_ERRORS, Downloader, _format_error
+
+
+@dataclass
+class _AlbumProgress:
+    job: Job
+    output_path: str
+    total: int
+    completed: int = 0
+    failed: int = 0
+    # Tracks still to download, in playlist order, and transfers running.
+    pending: Deque[Track] = field(default_factory=deque)
+    upcoming: List[Track] = field(default_factory=list)
+    running: int = 0
+
+    @property
+    def album(self) -> Album:
+        return self.job.album
+
+
+class Scheduler:
+    """Downloads the tracks of up to max_albums albums at once, with at
+       most max_transfers transfers in total and downloader.max_workers
+       per album."""
+
+    def __init__(
+            self,
+            downloader: Downloader,
+            on_album_complete_callback: Callable[[Album, int, int, Optional[str]], None],
+            max_transfers: int = 8,
+            max_albums: int = 2
+    ):
+        self.downloader = downloader
+        self.on_album_complete_callback = on_album_complete_callback
+        self.max_transfers = max_transfers
+        self.max_albums = max_albums
+
+    def _submit_pending(
+            self,
+            executor: ThreadPoolExecutor,
+            futures: Dict[Future, Tuple[_AlbumProgress, Optional[Song]]],
+            progress: _AlbumProgress
+    ) -> None:
+        while progress.pending and progress.running < self.downloader.max_workers:
+            future = executor.submit(
+                self.downloader.download_track,
+                track=progress.pending.popleft(),
+                album=progress.job.album,
+                artist=progress.job.artist,
+                image_data=progress.job.image_data,
+                output_path=progress.output_path,
+                upcoming=progress.upcoming
+            )
+            futures[future] = (progress, None)
+            progress.running += 1
+
+    def run(self, jobs: List[Job]) -> Generator:
+        queue: Deque[Job] = deque(jobs)
+        # Maps download futures to (progress, None) and transcode
+        # futures to (progress, song).
+        futures: Dict[Future, Tuple[_AlbumProgress, Optional[Song]]] = {}
+        in_flight = 0
+        executor = ThreadPoolExecutor(max_workers=self.max_transfers)
+        try:
+            while queue or futures:
+                # Admit new albums while below the in-flight limit. Each
+                # album has at most downloader.max_workers transfers queued,
+                # the executor caps the number of concurrent transfers.
+                while queue and in_flight < self.max_albums:
+                    job = queue.popleft()
+                    # A failing album is reported, the next ones still run.
+                    try:
+                        output_path = self.downloader.get_album_path(job.album, job.artist)
+                        tracks = self.downloader.get_tracks(job.album)
+                    except ALBUM_ERRORS as err:
+                        self.on_album_complete_callback(job.album, 0, 0, _format_error(err))
+                        continue
+                    if not tracks:
+                        self.on_album_complete_callback(job.album, 0, 0, None)
+                        continue
+                    progress = _AlbumProgress(
+                        job=job, output_path=output_path, total=len(tracks)
+                    )
+                    for track in tracks:
+                        song = self.downloader.get_completed_track(
+                            track=track,
+                            album=job.album,
+                            artist=job.artist,
+                            image_data=job.image_data,
+                            output_path=output_path
+                        )
+                        if song is not None:
+                            progress.completed += 1
+                            yield song, Stage.SKIP, None
+                        else:
+                            progress.pending.append(track)
+                    progress.upcoming = list(progress.pending)
+                    self._submit_pending(executor, futures, progress)
+                    if progress.completed == progress.total:
+                        self.on_album_complete_callback(
+                            job.album, progress.total, progress.total, None
+                        )
+                    else:
+                        in_flight += 1
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    progress, song = futures.pop(future)
+                    if song is None:
+                        progress.running -= 1
+                        self._submit_pending(executor, futures, progress)
+                        song, error, transcode = future.result()
+                        yield song, Stage.DOWNLOAD, error
+                        if transcode is not None:
+                            futures[transcode] = (progress, song)
+                            continue
+                    else:
+                        song, stage, error = self.downloader.get_transcode_result(song, future)
+                        yield song, stage, error
+
+                    progress.completed += 1
+                    if error:
+                        progress.failed += 1
+
+                    if progress.completed == progress.total:
+                        in_flight -= 1
+                        self.on_album_complete_callback(
+                            progress.album,
+                            progress.total - progress.failed,
+                            progress.total,
+                            None
+                        )
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,76 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+from ctube.containers import Song
+from ctube.metrics import collect_stages
+
+
+def _call(func: Callable[[Song], str], song: Song) -> Tuple[str, List[Tuple[str, float]]]:
+    # Runs in the worker: the stage durations recorded by func are sent
+    # back with its result.
+    collect_stages()
+    return func(song), collect_stages()
+
+
+class Transcoder:
+    def __init__(
+            self,
+            func: Callable[[Song], str],
+            max_workers: Optional[int] = None,
+            max_pending: Optional[int] = None,
+            on_stages: Optional[Callable[[Song, List[Tuple[str, float]]], None]] = None
+    ):
+        self.func = func
+        self.on_stages = on_stages
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 2
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # fork is unsafe here: the parent runs download threads.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def submit(self, song: Song) -> Future:
+        # Blocks the calling download thread while the queue is full,
+        # so downloads never run too far ahead of the encoders.
+        self._slots.acquire()
+        try:
+            inner = self._get_executor().submit(_call, self.func, song)
+        except BaseException:
+            self._slots.release()
+            raise
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+        inner.add_done_callback(lambda _: self._on_done(song, inner, future))
+        return future
+
+    def _on_done(self, song: Song, inner: Future, future: Future) -> None:
+        self._slots.release()
+        if inner.cancelled():
+            future.set_exception(CancelledError())
+        elif inner.exception() is not None:
+            future.set_exception(inner.exception())
+        else:
+            result, stages = inner.result()
+            # The caller waits on future: it is resolved even if on_stages fails.
+            try:
+                if self.on_stages is not None:
+                    self.on_stages(song, stages)
+            finally:
+                future.set_result(result)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,360 @@
+import os
+import json
+import time
+import threading
+from typing import Any, BinaryIO, Callable, Dict, Generator, Optional, Tuple
+from ctube.errors import IncompleteTransfer, TransferInterrupted, UnexpectedRange
+from ctube.limits import HostBackoff, TokenBucket
+from ctube.transport import get_session
+
+
+# pytubefix's 9MB range size, reduced for a more responsive progress bar.
+DEFAULT_CHUNK_SIZE = 9437184 // 15
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 9437184
+
+# googlevideo answers 403 as well as 429 when a client is throttled.
+THROTTLE_STATUS_CODES = (403, 429)
+
+_stop_event = threading.Event()
+
+
+def stop() -> None:
+    """Interrupts every running transfer at the next chunk boundary."""
+    _stop_event.set()
+
+
+def stopped() -> bool:
+    return _stop_event.is_set()
+
+
+class ChunkSizer:
+    """Sizes range requests from the throughput and latency measured so far.
+
+    Each request should take about target_duration seconds to transfer,
+    and never much less than the round trip it costs, so fast links make
+    few large requests and slow ones keep a responsive progress bar.
+    """
+
+    def __init__(
+            self,
+            initial: int = DEFAULT_CHUNK_SIZE,
+            min_size: int = MIN_CHUNK_SIZE,
+            max_size: int = MAX_CHUNK_SIZE,
+            target_duration: float = 1.0,
+            smoothing: float = 0.3
+    ):
+        if min_size > max_size:
+            raise ValueError("min_size must not exceed max_size")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_duration = target_duration
+        self.smoothing = smoothing
+        self.size = self._clamp(initial)
+        self.throughput: Optional[float] = None  # bytes per second
+        self.latency: Optional[float] = None  # seconds
+
+    def _clamp(self, size: float) -> int:
+        return int(min(max(size, self.min_size), self.max_size))
+
+    def _average(self, previous: Optional[float], value: float) -> float:
+        if previous is None:
+            return value
+        return self.smoothing * value + (1 - self.smoothing) * previous
+
+    def update(self, received: int, latency: float, elapsed: float) -> int:
+        """Records a request of received bytes and returns the next size."""
+        transfer_time = max(elapsed - latency, 1e-3)
+        self.throughput = self._average(self.throughput, received / transfer_time)
+        self.latency = self._average(self.latency, max(latency, 0.0))
+        duration = max(self.target_duration, 4 * self.latency)
+        self.size = self._clamp(self.throughput * duration)
+        return self.size
+
+
+def _wait(delay: float) -> None:
+    if delay > 0 and _stop_event.wait(delay):
+        raise TransferInterrupted("Transfer interrupted")
+
+
+def limit_chunk_size(chunk_size: int, limiter: Optional[TokenBucket]) -> int:
+    """Caps chunk_size to the burst of limiter, so a single range request
+       can't run past the bandwidth cap."""
+    if limiter is None or limiter.rate is None:
+        return chunk_size
+    return max(min(chunk_size, int(limiter.burst)), 1)
+
+
+def check_range(response: Any, position: int) -> None:
+    """Raises UnexpectedRange unless response is a partial response
+       starting at position: a server ignoring the Range header sends
+       the stream from its first byte."""
+    if response.status_code != 206:
+        raise UnexpectedRange(
+            f"Expected a partial response at byte {position}, got HTTP {response.status_code}"
+        )
+    content_range = response.headers.get("Content-Range", "")
+    try:
+        start = int(content_range.split()[1].split("-")[0])
+    except (IndexError, ValueError):
+        start = None
+    if start != position:
+        raise UnexpectedRange(f"Expected a range at byte {position}, got {content_range!r}")
+
+
+def _get_retry_after(response: Any) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None  # missing or an HTTP date
+
+
+class RangePolicy:
+    """Sizing, bandwidth, retry and throttling decisions of the range
+    requests of one transfer, shared by the threaded and the asyncio
+    iter_range: those only send the requests and wait the delays.
+    """
+
+    def __init__(
+            self,
+            url: str,
+            end: int,
+            chunk_size: int,
+            max_retries: int = 0,
+            sizer: Optional[ChunkSizer] = None,
+            limiter: Optional[TokenBucket] = None,
+            backoff: Optional[HostBackoff] = None,
+            on_throttle: Optional[Callable[[float], None]] = None,
+            on_retry: Optional[Callable[[BaseException], None]] = None
+    ):
+        self.url = url
+        self.end = end
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.sizer = sizer
+        self.limiter = limiter
+        self.backoff = backoff
+        self.on_throttle = on_throttle
+        self.on_retry = on_retry
+        self.tries = self.throttles = 0
+
+    def next_range(self, position: int) -> Tuple[Dict[str, str], float]:
+        """Returns the headers of the request for the range at position,
+           and how long to wait before sending it."""
+        chunk_size = self.sizer.size if self.sizer is not None else self.chunk_size
+        stop_position = min(position + limit_chunk_size(chunk_size, self.limiter), self.end) - 1
+        self.tries = self.throttles = 0
+        delay = 0.0
+        if self.limiter is not None:
+            delay = self.limiter.reserve(stop_position - position + 1)
+        return {"Range": f"bytes={position}-{stop_position}"}, delay
+
+    def attempt_delay(self) -> float:
+        """Returns how long to wait before each attempt of a request."""
+        return self.backoff.reserve(self.url) if self.backoff is not None else 0.0
+
+    def retry(self, err: BaseException) -> None:
+        """Records a connection error, raises err if out of retries."""
+        if self.tries >= self.max_retries:
+            raise err
+        self.tries += 1
+        if self.on_retry is not None:
+            self.on_retry(err)
+
+    def throttled(self, err: BaseException, response: Any) -> None:
+        """Records an HTTP error, raises err unless it is a throttling
+           response that the backoff still retries."""
+        if (
+                self.backoff is None
+                or getattr(response, "status_code", None) not in THROTTLE_STATUS_CODES
+                or self.throttles >= self.backoff.max_retries
+        ):
+            raise err
+        self.throttles += 1
+        delay = self.backoff.throttled(self.url, retry_after=_get_retry_after(response))
+        if self.on_throttle is not None:
+            self.on_throttle(delay)
+
+    def received(self, chunk: bytes, position: int, latency: float, elapsed: float) -> None:
+        if self.backoff is not None:
+            self.backoff.succeeded(self.url)
+        if not chunk:
+            raise IncompleteTransfer(f"Empty response at byte {position} of {self.end}")
+        if self.sizer is not None:
+            self.sizer.update(len(chunk), latency=latency, elapsed=elapsed)
+
+
+def iter_range(
+        url: str,
+        start: int,
+        end: int,
+        chunk_size: int,
+        timeout: Optional[int] = None,
+        max_retries: int = 0,
+        sizer: Optional[ChunkSizer] = None,
+        limiter: Optional[TokenBucket] = None,
+        backoff: Optional[HostBackoff] = None,
+        on_throttle: Optional[Callable[[float], None]] = None,
+        on_retry: Optional[Callable[[BaseException], None]] = None
+) -> Generator[bytes, None, None]:
+    """Yields the bytes [start, end) of url, one Range request per chunk.
+
+    With a sizer, chunk_size is ignored and every request is sized by it.
+    The limiter caps the bandwidth: each range is reserved before being
+    requested, and is never larger than the limiter's burst. With a
+    backoff, throttled requests are retried after a delay, reported to
+    on_throttle, instead of failing.
+    """
+    from requests.exceptions import ChunkedEncodingError, ConnectionError, HTTPError, Timeout
+    policy = RangePolicy(
+        url,
+        end=end,
+        chunk_size=chunk_size,
+        max_retries=max_retries,
+        sizer=sizer,
+        limiter=limiter,
+        backoff=backoff,
+        on_throttle=on_throttle,
+        on_retry=on_retry
+    )
+    position = start
+    while position < end:
+        if _stop_event.is_set():
+            raise TransferInterrupted("Transfer interrupted")
+
+        headers, delay = policy.next_range(position)
+        if limiter is not None:
+            _wait(delay)
+        while True:
+            if backoff is not None:
+                _wait(policy.attempt_delay())
+            try:
+                started = time.perf_counter()
+                response = get_session().get(url, headers=headers, timeout=timeout)
+                response.raise_for_status()
+                check_range(response, position)
+                chunk = response.content
+            except (ConnectionError, Timeout, ChunkedEncodingError) as err:
+                # Only connection level errors are retried.
+                policy.retry(err)
+            except HTTPError as err:
+                policy.throttled(err, err.response)
+            else:
+                break
+
+        # response.elapsed stops at the headers, the rest is the body.
+        policy.received(
+            chunk,
+            position,
+            latency=response.elapsed.total_seconds(),
+            elapsed=time.perf_counter() - started
+        )
+        position += len(chunk)
+        yield chunk
+
+
+class PartFile:
+    """The '.part' file a stream is downloaded to, and its '.part.json'
+    sidecar recording the byte ranges received so far, so an interrupted
+    transfer restarts where it stopped.
+    """
+
+    def __init__(self, filepath: str, filesize: int):
+        self.filepath = filepath
+        self.filesize = filesize
+        self.part_filepath = f"{filepath}.part"
+        self.state_filepath = f"{self.part_filepath}.json"
+        self.received = 0
+        self._file: Optional[BinaryIO] = None
+
+    def _load_state(self) -> int:
+        try:
+            with open(self.state_filepath) as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return 0
+        if state.get("filesize") != self.filesize:
+            return 0  # a different stream, start over
+        # Data is written sequentially, so only the first range is usable.
+        ranges = state.get("ranges") or [[0, 0]]
+        start, end = ranges[0]
+        return end if start == 0 else 0
+
+    def _save_state(self) -> None:
+        tmp_filepath = f"{self.state_filepath}.tmp"
+        with open(tmp_filepath, "w") as file:
+            json.dump({"filesize": self.filesize, "ranges": [[0, self.received]]}, file)
+        os.replace(tmp_filepath, self.state_filepath)
+
+    def open(self) -> int:
+        """Opens the part file and returns the position to resume from."""
+        os.makedirs(os.path.dirname(self.part_filepath), exist_ok=True)
+        exists = os.path.exists(self.part_filepath)
+        if exists:
+            self.received = min(self._load_state(), os.path.getsize(self.part_filepath))
+        self._file = open(self.part_filepath, "r+b" if exists else "wb")
+        self._file.seek(self.received)
+        self._file.truncate()
+        return self.received
+
+    def write(self, chunk: bytes) -> int:
+        """Appends chunk and returns the number of bytes received so far."""
+        assert self._file is not None
+        self._file.write(chunk)
+        self._file.flush()
+        self.received += len(chunk)
+        self._save_state()
+        return self.received
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def finish(self) -> str:
+        """Moves the complete part file to filepath and returns it."""
+        size = os.path.getsize(self.part_filepath)
+        if size != self.filesize:
+            raise IncompleteTransfer(f"Received {size} of {self.filesize} bytes")
+        os.replace(self.part_filepath, self.filepath)
+        if os.path.exists(self.state_filepath):
+            os.remove(self.state_filepath)
+        return self.filepath
+
+
+def download(
+        url: str,
+        filepath: str,
+        filesize: int,
+        chunk_size: int,
+        on_progress: Callable[[int], None],
+        timeout: Optional[int] = None,
+        max_retries: int = 0,
+        sizer: Optional[ChunkSizer] = None,
+        limiter: Optional[TokenBucket] = None,
+        backoff: Optional[HostBackoff] = None,
+        on_throttle: Optional[Callable[[float], None]] = None,
+        on_retry: Optional[Callable[[BaseException], None]] = None
+) -> str:
+    """Downloads url to filepath through a resumable PartFile."""
+    part = PartFile(filepath, filesize)
+    try:
+        received = part.open()
+        on_progress(received)
+        for chunk in iter_range(
+                url,
+                start=received,
+                end=filesize,
+                chunk_size=chunk_size,
+                timeout=timeout,
+                max_retries=max_retries,
+                sizer=sizer,
+                limiter=limiter,
+                backoff=backoff,
+                on_throttle=on_throttle,
+                on_retry=on_retry
+        ):
+            on_progress(part.write(chunk))
+    finally:
+        part.close()
+    return part.finish()
@@ -0,0 +1,46 @@
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import requests
+    from ctube.cassette import Cassette
+
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"}
+
+_lock = threading.Lock()
+_session: Optional["requests.Session"] = None
+_pool_size = 16
+_cassette: Optional["Cassette"] = None
+
+
+def configure(pool_size: int = 16, cassette: Optional["Cassette"] = None) -> None:
+    """Sets the number of kept-alive connections per host and the
+       cassette recording or replaying the requests, if any.
+       The shared session is rebuilt on next use."""
+    global _session, _pool_size, _cassette
+    with _lock:
+        _pool_size = pool_size
+        _cassette = cassette
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session() -> "requests.Session":
+    """Returns the process-wide session. Connections and TLS sessions are
+       reused across covers, update checks and stream transfers."""
+    global _session
+    with _lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+            adapter = HTTPAdapter(pool_connections=_pool_size, pool_maxsize=_pool_size)
+            if _cassette is not None:
+                adapter = _cassette.adapter(adapter)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
@@ -1,6 +1,69 @@
-import requests
+import os
+import json
+import time
+import threading
+from typing import Optional
+from ctube.transport import get_session
 
 
-def get_latest_version(pkg_name: str) -> str:
-    res = requests.get(f"https://pypi.org/pypi/{pkg_name}/json")
+def get_latest_version(pkg_name: str, timeout: int = 5) -> str:
+    res = get_session().get(f"https://pypi.org/pypi/{pkg_name}/json", timeout=timeout)
     return res.json()["info"]["version"]
+
+
+class VersionCheck:
+    """Looks up the latest release of a package in a background thread.
+       The answer is cached on disk for max_age seconds."""
+
+    def __init__(
+            self,
+            pkg_name: str,
+            cache_path: str,
+            max_age: int = 24 * 60 * 60,
+            timeout: int = 5
+    ):
+        self.pkg_name = pkg_name
+        self.cache_path = cache_path
+        self.max_age = max_age
+        self.timeout = timeout
+        self.latest_version: Optional[str] = None
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def _load(self) -> Optional[str]:
+        try:
+            with open(self.cache_path) as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if time.time() - data.get("checked_at", 0) > self.max_age:
+            return None
+        return data.get("version")
+
+    def _store(self, version: str) -> None:
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"version": version, "checked_at": time.time()}, file)
+        os.replace(tmp_path, self.cache_path)
+
+    def _run(self) -> None:
+        from requests.exceptions import RequestException
+        try:
+            self.latest_version = get_latest_version(self.pkg_name, timeout=self.timeout)
+            self._store(self.latest_version)
+        except (RequestException, KeyError, ValueError, OSError):
+            pass
+        finally:
+            self._done.set()
+
+    def start(self) -> None:
+        # A fresh cached answer is available immediately, without a thread.
+        self.latest_version = self._load()
+        if self.latest_version is not None:
+            self._done.set()
+        else:
+            threading.Thread(target=self._run, daemon=True).start()
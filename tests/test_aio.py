@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+from innertube.clients import InnerTube
+
+from ctube import aio
+from ctube.aio import AsyncDownloader
+from ctube.extractors import extract_artist_id, iter_albums
+from benchmarks.bench_download import BenchmarkDownloader, rename_callback
+from benchmarks.standin import ARTIST_NAME, StandInConfig, StandInServer
+
+
+class StandInAsyncDownloader(BenchmarkDownloader, AsyncDownloader):
+    """AsyncDownloader resolving stream manifests from the stand-in."""
+
+
+def test_album_from_the_standin(monkeypatch, tmp_path):
+    server = StandInServer(StandInConfig(albums=1, tracks=6, stream_size=200_000, latency=0.01)).start()
+    client = InnerTube("WEB_REMIX")
+    client.adaptor.session = httpx.Client(base_url=f"{server.base_url}/youtubei/v1/")
+    album = next(iter_albums(client, client.browse(f"MPAD{extract_artist_id(client.search(ARTIST_NAME))}")))
+
+    running = peak = 0
+    download = aio.download
+
+    async def counting_download(*args, **kwargs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        try:
+            return await download(*args, **kwargs)
+        finally:
+            running -= 1
+
+    monkeypatch.setattr(aio, "download", counting_download)
+
+    async def run():
+        async with StandInAsyncDownloader(
+                output_path=str(tmp_path),
+                on_complete_callback=rename_callback,
+                on_progress_callback=lambda song, filesize, received: None,
+                transcode_workers=1,
+                max_host_connections=2,
+                chunk_size=65536,
+                client=client,
+                base_url=server.base_url
+        ) as downloader:
+            return [
+                (song.filepath, error)
+                async for song, error in downloader.adownload_album(album, ARTIST_NAME, b"")
+            ]
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        server.shutdown()
+    assert len(results) == 6
+    assert all(error is None for _, error in results)
+    assert sorted(filepath.rsplit("/", 1)[1] for filepath, _ in results) == [
+        f"Track {track}.mp3" for track in range(6)
+    ]
+    assert peak == 2  # max_host_connections
@@ -1,6 +1,9 @@
+import io
 import sys
 import os
 
+import pytest
+
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -8,4 +11,62 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from ctube.cli import main
 
 
-main()
+def test_help():
+    with pytest.raises(SystemExit) as exit_info:
+        main(["--help"])
+    assert exit_info.value.code == 0
+
+
+def test_invalid_indexes_are_a_usage_error(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(["download", "artist name", "--indexes", "x:y:z"])
+    assert exit_info.value.code == 2
+    assert capsys.readouterr().out == ""
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.jobs = []
+
+    def run(self, jobs):
+        self.jobs.extend(jobs)
+        return iter(())
+
+
+def test_unreadable_cover_cache_falls_back_to_no_cover(monkeypatch, tmp_path):
+    from requests.exceptions import ConnectionError
+    from ctube import app as app_module
+    from ctube.app import App
+    from ctube.containers import Album
+    from ctube.progress import ProgressRenderer
+
+    monkeypatch.setattr(app_module, "CACHE", str(tmp_path / "cache"))
+    monkeypatch.setattr(app_module, "connected_to_internet", lambda: True)
+    app = App(
+        output_path=str(tmp_path / "music"),
+        progress=ProgressRenderer(stream=io.StringIO(), interactive=False)
+    )
+    app._artist_name = "Artist"
+    app._albums = [
+        Album(f"Album {i}", "Album", 2024, f"https://covers/{i}", f"PL{i}") for i in range(3)
+    ]
+    errors = {
+        "https://covers/0": PermissionError(13, "Permission denied"),
+        "https://covers/1": ConnectionError("offline")
+    }
+
+    def get(url):
+        if url in errors:
+            raise errors[url]
+        return b"cover"
+
+    monkeypatch.setattr(app.covers, "get", get)
+    app._scheduler = FakeScheduler()
+    try:
+        app._download("0:3")
+    finally:
+        app.close()
+    # The cover of the second album could not be downloaded: it is skipped.
+    assert [(job.album.title, job.image_data) for job in app._scheduler.jobs] == [
+        ("Album 0", b""), ("Album 2", b"cover")
+    ]
@@ -0,0 +1,26 @@
+import os
+import time
+
+from ctube.cache import ResponseCache
+
+
+def test_expired_entries_are_pruned_at_startup(tmp_path):
+    cache = ResponseCache(path=str(tmp_path), max_age=60)
+    cache.set("old", {"data": 1})
+    cache.set("new", {"data": 2})
+    past = time.time() - 120
+    os.utime(tmp_path / "old.json", (past, past))
+    ResponseCache(path=str(tmp_path), max_age=60)
+    assert sorted(os.listdir(tmp_path)) == ["new.json"]
+
+
+def test_oldest_entries_are_pruned_over_max_size(tmp_path):
+    cache = ResponseCache(path=str(tmp_path), max_size=1024)
+    for index in range(10):
+        cache.set(f"key{index}", "x" * 200)
+        past = time.time() - 100 + index
+        os.utime(tmp_path / f"key{index}.json", (past, past))
+    cache.set("last", "x" * 200)
+    files = sorted(os.listdir(tmp_path))
+    assert "last.json" in files and "key0.json" not in files
+    assert sum(os.path.getsize(tmp_path / name) for name in files) <= 1024
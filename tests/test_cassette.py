@@ -0,0 +1,84 @@
+import os
+
+import httpx
+import pytest
+from innertube.clients import InnerTube
+
+from ctube import transport
+from ctube.cassette import Cassette
+from ctube.containers import Job
+from ctube.errors import CassetteMiss
+from ctube.extractors import extract_artist_id, iter_albums
+from ctube.scheduler import Scheduler
+from benchmarks.bench_download import BenchmarkDownloader, rename_callback
+from benchmarks.standin import ARTIST_NAME, COVER, StandInConfig, StandInServer
+
+
+@pytest.fixture(autouse=True)
+def reset_transport():
+    yield
+    transport.configure()
+
+
+def _session(cassette, output_path, base_url, client=None):
+    """Downloads every album of the stand-in artist through the cassette."""
+    transport.configure(cassette=cassette)
+    downloader = BenchmarkDownloader(
+        output_path=str(output_path),
+        on_complete_callback=rename_callback,
+        on_progress_callback=lambda song, filesize, received: None,
+        client=cassette.wrap_client(client),
+        cassette=cassette,
+        base_url=base_url,
+        transcode_workers=1,
+        chunk_size=65536
+    )
+    client = downloader.client
+    artist_id = extract_artist_id(client.search(query=ARTIST_NAME))
+    jobs = [
+        Job(album, ARTIST_NAME, transport.get_session().get(album.thumbnail_url).content)
+        for album in iter_albums(client, client.browse(f"MPAD{artist_id}"))
+    ]
+    results = list(Scheduler(downloader, lambda album, downloaded, total, error: None).run(jobs))
+    downloader.close()
+    files = sorted(
+        (os.path.relpath(filepath, output_path), os.path.getsize(filepath))
+        for filepath in (
+            os.path.join(root, name)
+            for root, _, names in os.walk(output_path) for name in names
+            if name.endswith(".mp3")
+        )
+    )
+    return jobs, [error for _, _, error in results], files
+
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "session.cassette")
+    server = StandInServer(StandInConfig(albums=12, tracks=2, stream_size=150_000, page_size=5)).start()
+    try:
+        client = InnerTube("WEB_REMIX")
+        client.adaptor.session = httpx.Client(base_url=f"{server.base_url}/youtubei/v1/")
+        cassette = Cassette(path, "record")
+        recorded = _session(cassette, tmp_path / "recorded", server.base_url, client)
+        cassette.save()
+    finally:
+        server.shutdown()
+
+    # Nothing listens anymore: every response comes from the cassette.
+    replayed = _session(Cassette(path, "replay", time_scale=0), tmp_path / "replayed", server.base_url)
+    for jobs, errors, files in (recorded, replayed):
+        assert [job.album.title for job in jobs] == [f"Album {album}" for album in range(12)]
+        assert all(job.image_data == COVER for job in jobs)
+        assert not any(errors)
+        assert len(files) == 24
+    assert replayed[2] == recorded[2]
+
+
+def test_replay_misses(tmp_path):
+    path = str(tmp_path / "empty.cassette")
+    Cassette(path, "record").save()
+    cassette = Cassette(path, "replay", time_scale=0)
+    with pytest.raises(CassetteMiss):
+        cassette.wrap_client().browse("MPADmissing")
+    transport.configure(cassette=cassette)
+    assert transport.get_session().get("http://127.0.0.1:1/cover/0").status_code == 404
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from ctube import covers
+from ctube.covers import CoverCache
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self):
+        self.urls = []
+
+    def get(self, url, timeout=None):
+        self.urls.append(url)
+        return FakeResponse(url.encode())
+
+
+def test_prefetched_covers_are_kept_on_disk_only(monkeypatch, tmp_path):
+    session = FakeSession()
+    monkeypatch.setattr(covers.transport, "get_session", lambda: session)
+    cache = CoverCache(str(tmp_path))
+    urls = [f"https://covers/{index}" for index in range(20)]
+    cache.prefetch(urls)
+    cache._executor.shutdown(wait=True)  # every fetch and its callback done
+    assert not cache._futures
+    assert len(list(tmp_path.iterdir())) == 20
+
+    cache._executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        assert cache.get(urls[0]) == urls[0].encode()
+    finally:
+        cache._executor.shutdown()
+    # Read back from disk, not requested again.
+    assert sorted(session.urls) == sorted(urls)
+    assert not cache._futures
@@ -0,0 +1,184 @@
+import os
+import time
+import threading
+from concurrent.futures import CancelledError, Future
+
+from ctube.containers import Album, Stage, Track, Job
+from ctube.download import Downloader
+from ctube.formats import OutputFormat, OutputProfile
+from ctube.ledger import LedgerEntry
+from ctube.scheduler import Scheduler
+
+
+ALBUM = Album(
+    title="Album",
+    album_type="Album",
+    release_year=2020,
+    thumbnail_url="",
+    playlist_id="PL0"
+)
+TRACKS = [Track(video_id=f"v{i}", title=f"Track {i}", duration=60, track_num=i + 1) for i in range(3)]
+
+
+def _make_downloader(output_path, skip_existing):
+    downloader = Downloader(
+        output_path=str(output_path),
+        on_complete_callback=lambda song: song.filepath,
+        on_progress_callback=lambda song, filesize, received: None,
+        skip_existing=skip_existing,
+        client=object()
+    )
+    downloader.get_tracks = lambda album: TRACKS
+    return downloader
+
+
+def _run(downloader):
+    submitted = []
+
+    def download_track(track, album, artist, image_data, output_path, upcoming=()):
+        submitted.append(track.video_id)
+        song = downloader._make_song(track, album=album, artist=artist, image_data=image_data)
+        return song, None, None
+
+    downloader.download_track = download_track
+    results = list(Scheduler(downloader, lambda album, done, total, error: None).run(
+        [Job(album=ALBUM, artist="Artist", image_data=b"")]
+    ))
+    return submitted, results
+
+
+def _record_completed(downloader, track):
+    album_path = downloader.get_album_path(ALBUM, "Artist")
+    os.makedirs(album_path, exist_ok=True)
+    filepath = os.path.join(album_path, f"{track.title}.mp3")
+    with open(filepath, "wb") as file:
+        file.write(b"mp3")
+    downloader.ledger.add(
+        LedgerEntry(
+            video_id=track.video_id,
+            playlist_id=ALBUM.playlist_id,
+            title=track.title,
+            filepath=filepath,
+            size=3,
+            format="mp3",
+            completed_at=time.time()
+        )
+    )
+
+
+def test_ledger_known_tracks_are_skipped(tmp_path):
+    downloader = _make_downloader(tmp_path, skip_existing=True)
+    try:
+        _record_completed(downloader, TRACKS[0])
+        submitted, results = _run(downloader)
+    finally:
+        downloader.close()
+    assert submitted == ["v1", "v2"]
+    assert [stage for _, stage, _ in results].count(Stage.SKIP) == 1
+
+
+def test_overwrite_resubmits_ledger_known_tracks(tmp_path):
+    downloader = _make_downloader(tmp_path, skip_existing=False)
+    try:
+        _record_completed(downloader, TRACKS[0])
+        submitted, results = _run(downloader)
+    finally:
+        downloader.close()
+    assert sorted(submitted) == ["v0", "v1", "v2"]
+    assert Stage.SKIP not in [stage for _, stage, _ in results]
+
+
+def test_failing_album_does_not_end_the_run(tmp_path):
+    downloader = _make_downloader(tmp_path, skip_existing=True)
+    broken = Album(
+        title="Broken",
+        album_type="Album",
+        release_year=2020,
+        thumbnail_url="",
+        playlist_id="PL1"
+    )
+
+    def get_tracks(album):
+        if album is broken:
+            raise KeyError("contents")
+        return TRACKS
+
+    downloader.get_tracks = get_tracks
+    downloader.download_track = lambda track, album, artist, image_data, output_path, upcoming=(): (
+        downloader._make_song(track, album=album, artist=artist, image_data=image_data), None, None
+    )
+    completed = []
+    scheduler = Scheduler(
+        downloader,
+        lambda album, done, total, error: completed.append((album.title, done, total, error))
+    )
+    try:
+        results = list(scheduler.run([
+            Job(album=broken, artist="Artist", image_data=b""),
+            Job(album=ALBUM, artist="Artist", image_data=b"")
+        ]))
+    finally:
+        downloader.close()
+    assert len(results) == 3
+    assert completed[0][:3] == ("Broken", 0, 0) and "KeyError" in completed[0][3]
+    assert completed[1] == ("Album", 3, 3, None)
+
+
+def test_completed_track_lookup_creates_no_directories(tmp_path):
+    downloader = _make_downloader(tmp_path, skip_existing=True)
+    downloader.profiles = [
+        OutputProfile(OutputFormat.MP3),
+        OutputProfile(OutputFormat.OPUS, directory="opus/{artist}")
+    ]
+    try:
+        output_path = downloader.get_album_path(ALBUM, "Artist")
+        song = downloader.get_completed_track(TRACKS[0], ALBUM, "Artist", b"", output_path)
+    finally:
+        downloader.close()
+    assert song is None
+    assert os.listdir(tmp_path) == [".ctube.db"]
+
+
+def test_cancelled_transcodes_are_reported(tmp_path):
+    downloader = _make_downloader(tmp_path, skip_existing=True)
+    song = downloader._make_song(TRACKS[0], album=ALBUM, artist="Artist", image_data=b"")
+    future = Future()
+    future.set_exception(CancelledError())
+    try:
+        _, stage, error = downloader.get_transcode_result(song, future)
+    finally:
+        downloader.close()
+    assert stage == Stage.TRANSCODE and "CancelledError" in error
+
+
+def test_transfers_per_album_are_capped_by_max_workers(tmp_path):
+    downloader = _make_downloader(tmp_path, skip_existing=True)
+    downloader.max_workers = 2
+    albums = [ALBUM, Album("Other", "Album", 2020, "", "PL1")]
+    downloader.get_tracks = lambda album: [
+        Track(video_id=f"{album.playlist_id}-{i}", title=f"Track {i}", duration=60, track_num=i + 1)
+        for i in range(6)
+    ]
+    lock = threading.Lock()
+    running = {album.playlist_id: 0 for album in albums}
+    peaks = {album.playlist_id: 0 for album in albums}
+
+    def download_track(track, album, artist, image_data, output_path, upcoming=()):
+        with lock:
+            running[album.playlist_id] += 1
+            peaks[album.playlist_id] = max(peaks[album.playlist_id], running[album.playlist_id])
+        time.sleep(0.02)
+        with lock:
+            running[album.playlist_id] -= 1
+        return downloader._make_song(track, album=album, artist=artist, image_data=image_data), None, None
+
+    downloader.download_track = download_track
+    scheduler = Scheduler(
+        downloader, lambda album, done, total, error: None, max_transfers=8, max_albums=2
+    )
+    try:
+        results = list(scheduler.run([Job(album=album, artist="Artist", image_data=b"") for album in albums]))
+    finally:
+        downloader.close()
+    assert len(results) == 12
+    assert peaks == {"PL0": 2, "PL1": 2}
@@ -0,0 +1,44 @@
+from ctube.encoder import build_command
+from ctube.formats import OutputFormat, OutputProfile
+
+
+def _outputs(command):
+    return [command[index + 2] for index, arg in enumerate(command) if arg == "-f"]
+
+
+def test_single_output():
+    command = build_command([("a.mp3", OutputProfile(OutputFormat.MP3, bitrate=320))], source="a.mp4")
+    assert command[command.index("-i") + 1] == "a.mp4"
+    assert "-filter_complex" not in command
+    assert command[-9:] == ["-map", "0:a", "-c:a", "libmp3lame", "-b:a", "320k", "-f", "mp3", "a.mp3"]
+
+
+def test_encoded_outputs_share_one_decode():
+    command = build_command(
+        [
+            ("a.mp3", OutputProfile(OutputFormat.MP3)),
+            ("a.m4a", OutputProfile(OutputFormat.M4A)),
+            ("b.mp3", OutputProfile(OutputFormat.MP3, bitrate=128, sample_rate=22050))
+        ],
+        source_subtype="mp4"
+    )
+    assert command[command.index("-filter_complex") + 1] == "[0:a]asplit=2[a0][a2]"
+    maps = [command[index + 1] for index, arg in enumerate(command) if arg == "-map"]
+    # The M4A profile remuxes the source, it is not part of the split.
+    assert maps == ["[a0]", "0:a", "[a2]"]
+    assert command[command.index("0:a") + 1:command.index("0:a") + 3] == ["-c:a", "copy"]
+    assert _outputs(command) == ["a.mp3", "a.m4a", "b.mp3"]
+    assert command[command.index("22050") - 1] == "-ar"
+
+
+def test_tags_and_cover_go_to_encoder_tagged_formats():
+    command = build_command(
+        [("a.mp3", OutputProfile(OutputFormat.MP3)), ("a.m4a", OutputProfile(OutputFormat.M4A))],
+        tags={"title": "Title"},
+        cover="cover.jpg"
+    )
+    mp3 = command[:command.index("a.mp3")]
+    m4a = command[command.index("a.mp3"):]
+    assert command[command.index("-i", command.index("-i") + 1) + 1] == "cover.jpg"
+    assert "title=Title" in mp3 and "1:0" in mp3
+    assert "title=Title" not in m4a and "1:0" not in m4a
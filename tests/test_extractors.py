@@ -0,0 +1,115 @@
+from benchmarks.standin import (
+    ARTIST_ID,
+    ARTIST_NAME,
+    StandInConfig,
+    artist_response,
+    continuation_response,
+    search_response,
+    tracks_continuation_response,
+    tracks_response
+)
+from ctube.extractors import extract_artist_id, extract_artist_name, extract_tracks, iter_albums
+
+BASE_URL = "http://stand-in"
+
+
+class FakeClient:
+    """Serves the continuations of the stand-in browse responses."""
+
+    def __init__(self, config):
+        self.config = config
+        self.continuations = []
+
+    def browse(self, continuation):
+        self.continuations.append(continuation)
+        if continuation.startswith("albums:"):
+            return continuation_response(BASE_URL, self.config, int(continuation.split(":")[1]))
+        _, album, page = continuation.split(":")
+        return tracks_continuation_response(self.config, int(album), int(page))
+
+
+def test_artist():
+    assert extract_artist_id(search_response()) == ARTIST_ID
+    assert extract_artist_name(artist_response(BASE_URL, StandInConfig())) == ARTIST_NAME
+
+
+def test_albums_follow_continuations():
+    config = StandInConfig(albums=25)
+    client = FakeClient(config)
+    albums = iter_albums(client, artist_response(BASE_URL, config))
+    first = next(albums)
+    assert client.continuations == []  # pages are requested lazily
+    assert (first.title, first.album_type, first.release_year) == ("Album 0", "Album", 2020)
+    assert first.thumbnail_url == f"{BASE_URL}/cover/0"
+    assert first.playlist_id == "PLstandin0000"
+    rest = list(albums)
+    assert client.continuations == ["albums:1", "albums:2"]
+    assert [album.title for album in rest] == [f"Album {album}" for album in range(1, 25)]
+
+
+def test_albums_with_the_old_continuations():
+    config = StandInConfig(albums=15)
+    client = FakeClient(config)
+    data = artist_response(BASE_URL, config)
+    grid = data["contents"]["singleColumnBrowseResultsRenderer"]["tabs"][0][
+        "tabRenderer"]["content"]["sectionListRenderer"]["contents"][0]["gridRenderer"]
+    grid["items"].pop()  # continuationItemRenderer
+    grid["continuations"] = [{"nextContinuationData": {"continuation": "albums:1"}}]
+    client.browse = lambda continuation: {
+        "continuationContents": {
+            "gridContinuation": {
+                "items": continuation_response(BASE_URL, config, 1)[
+                    "onResponseReceivedActions"][0]["appendContinuationItemsAction"][
+                    "continuationItems"]
+            }
+        }
+    }
+    assert [album.playlist_id for album in iter_albums(client, data)] == [
+        f"PLstandin{album:04d}" for album in range(15)
+    ]
+
+
+def _shelf(data):
+    return data["contents"]["singleColumnBrowseResultsRenderer"]["tabs"][0][
+        "tabRenderer"]["content"]["sectionListRenderer"]["contents"][0][
+        "musicPlaylistShelfRenderer"]
+
+
+def test_tracks_follow_continuations():
+    config = StandInConfig(tracks=250)
+    client = FakeClient(config)
+    tracks = extract_tracks(client, tracks_response(config, 3))
+    assert client.continuations == ["tracks:3:1", "tracks:3:2"]
+    assert [track.track_num for track in tracks] == list(range(1, 251))
+    assert tracks[-1].video_id == "v0003t00249"
+    assert tracks[-1].title == "Track 249"
+    assert tracks[-1].duration == 210
+
+
+def test_tracks_with_the_old_continuations():
+    config = StandInConfig(tracks=150)
+    client = FakeClient(config)
+    data = tracks_response(config, 0)
+    shelf = _shelf(data)
+    shelf["contents"].pop()  # continuationItemRenderer
+    shelf["continuations"] = [{"nextContinuationData": {"continuation": "tracks:0:1"}}]
+    client.browse = lambda continuation: {
+        "continuationContents": {
+            "musicPlaylistShelfContinuation": {
+                "contents": tracks_continuation_response(config, 0, 1)[
+                    "onResponseReceivedActions"][0]["appendContinuationItemsAction"][
+                    "continuationItems"]
+            }
+        }
+    }
+    assert [track.track_num for track in extract_tracks(client, data)] == list(range(1, 151))
+
+
+def test_tracks_without_duration_or_playlist_data():
+    config = StandInConfig(tracks=3)
+    data = tracks_response(config, 0)
+    items = _shelf(data)["contents"]
+    del items[0]["musicResponsiveListItemRenderer"]["fixedColumns"]
+    del items[1]["musicResponsiveListItemRenderer"]["playlistItemData"]
+    tracks = extract_tracks(FakeClient(config), data)
+    assert [(track.track_num, track.duration) for track in tracks] == [(1, None), (3, 210)]
@@ -0,0 +1,36 @@
+import pytest
+
+from ctube.formats import DEFAULT_DIRECTORY, OutputFormat, OutputProfile, parse_profile
+
+
+def test_parse_profile():
+    assert parse_profile("mp3") == OutputProfile(OutputFormat.MP3)
+    assert parse_profile("OPUS:64k:48000:previews/{artist}/{album}") == OutputProfile(
+        output_format=OutputFormat.OPUS,
+        bitrate=64,
+        sample_rate=48000,
+        directory="previews/{artist}/{album}"
+    )
+    assert parse_profile("m4a::44100").directory == DEFAULT_DIRECTORY
+
+
+@pytest.mark.parametrize("spec", ["flac", "mp3:fast", "mp3:320:44100:{label}"])
+def test_parse_profile_rejects_invalid_specs(spec):
+    with pytest.raises(ValueError):
+        parse_profile(spec)
+
+
+def test_default_profile_keys_are_the_format():
+    # Ledgers written before profiles existed remain valid.
+    assert OutputProfile(OutputFormat.M4A).key == "m4a"
+    assert OutputProfile(OutputFormat.MP3, bitrate=320).key == "mp3:320::{artist}/{album}"
+    assert OutputProfile(OutputFormat.OPUS, directory="{year}").key == "opus:::{year}"
+
+
+def test_copies():
+    assert OutputProfile(OutputFormat.M4A).copies("mp4")
+    assert OutputProfile(OutputFormat.OPUS).copies("webm")
+    assert not OutputProfile(OutputFormat.OPUS).copies("mp4")
+    assert not OutputProfile(OutputFormat.M4A, bitrate=128).copies("mp4")
+    assert not OutputProfile(OutputFormat.M4A, sample_rate=44100).copies("mp4")
+    assert not OutputProfile(OutputFormat.MP3).copies("mp4")
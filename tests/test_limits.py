@@ -0,0 +1,51 @@
+import types
+
+import pytest
+
+from ctube import limits
+from ctube.limits import HostBackoff
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(limits, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_throttles_double_the_interval_up_to_max_delay(clock):
+    backoff = HostBackoff(base_delay=1.0, max_delay=5.0)
+    assert backoff.reserve("https://a/1") == 0
+    assert [backoff.throttled("https://a/1") for _ in range(4)] == [1, 2, 4, 5]
+    clock.now += 5
+    # Requests are spaced by the interval, at most max_delay.
+    assert [backoff.reserve("https://a/2") for _ in range(3)] == [0, 5, 10]
+    # Other hosts are not affected.
+    assert backoff.reserve("https://b/1") == 0
+
+
+def test_retry_after_is_capped(clock):
+    backoff = HostBackoff(base_delay=1.0, max_delay=5.0)
+    assert backoff.throttled("https://a/1", retry_after=3) == 3
+    assert backoff.throttled("https://a/1", retry_after=60) == 5
+
+
+def test_successes_reset_the_interval(clock):
+    backoff = HostBackoff(base_delay=1.0, max_delay=60.0)
+    for _ in range(3):
+        backoff.throttled("https://a/1")
+    clock.now += 4
+    backoff.succeeded("https://a/1")
+    assert [backoff.reserve("https://a/1") for _ in range(2)] == [0, 2]
+    clock.now += 4
+    for _ in range(4):
+        backoff.succeeded("https://a/1")  # down to 0.125s, below base_delay / 4
+    assert [backoff.reserve("https://a/1") for _ in range(2)] == [0, 0]
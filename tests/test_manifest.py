@@ -0,0 +1,21 @@
+from ctube.cassette import RecordedStreamQuery
+from ctube.manifest import ManifestCache
+
+
+def test_claims_are_released_once_resolved():
+    prefetched = []
+
+    def resolve(video_id):
+        # Another track prefetching this video while it is being resolved.
+        cache.prefetch([video_id])
+        prefetched.append(video_id in cache._entries)
+        return RecordedStreamQuery()
+
+    cache = ManifestCache(resolve)
+    try:
+        for index in range(100):
+            cache.get(f"v{index}")
+    finally:
+        cache.shutdown()
+    assert prefetched == [False] * 100
+    assert not cache._claimed
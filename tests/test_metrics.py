@@ -0,0 +1,109 @@
+import json
+
+from ctube import metrics
+from ctube.containers import Album, Song
+from ctube.metrics import Metrics
+
+
+ALBUM = Album("Album", "Album", 2024, "", "PL1")
+
+
+def _song(video_id):
+    return Song(f"Track {video_id}", "Artist", 1, b"", f"{video_id}.mp3", ALBUM, video_id=video_id)
+
+
+Throttled = type('Throttled"By\\Host', (Exception,), {})
+
+
+def _metrics():
+    session = Metrics()
+    ok, failed = _song("v1"), _song("v2")
+    for seconds in (1.0, 2.0, 3.0):
+        session.observe("transfer", seconds, ok)
+    session.observe("transcode", 0.5)
+    session.observe('odd "stage"', 0.25)
+    session.add_bytes(ok, 600)
+    session.add_retry(ok)
+    session.add_throttle(failed)
+    session.add_throttle(failed)
+    session.set_error(failed, Throttled())
+    return session
+
+
+def test_json_report(tmp_path):
+    filepath = tmp_path / "metrics.json"
+    _metrics().write_json(str(filepath))
+    report = json.loads(filepath.read_text())
+    assert (report["tracks"], report["failed"], report["bytes"]) == (2, 1, 600)
+    assert (report["retries"], report["throttles"]) == (1, 2)
+    assert report["errors"] == {'Throttled"By\\Host': 1}
+    assert report["stages"]["transfer"] == {
+        "count": 3, "total": 6.0, "mean": 2.0, "p50": 2.0, "p95": 3.0, "max": 3.0
+    }
+    assert report["stages"]["transcode"]["count"] == 1
+    ok, failed = report["per_track"]
+    assert (ok["video_id"], ok["stages"], ok["throughput"], ok["error"]) == (
+        "v1", {"transfer": 6.0}, 100.0, None
+    )
+    assert (failed["video_id"], failed["throughput"], failed["error"]) == ("v2", None, 'Throttled"By\\Host')
+
+
+def test_prometheus_textfile(tmp_path):
+    filepath = tmp_path / "ctube.prom"
+    filepath.write_text("stale\n")
+    _metrics().write_prometheus(str(filepath))
+    lines = filepath.read_text().splitlines()
+    assert "stale" not in lines
+    assert [path.name for path in tmp_path.iterdir()] == ["ctube.prom"]  # no .tmp left
+
+    for name, kind in (
+            ("stage_duration_seconds", "summary"),
+            ("tracks_total", "counter"),
+            ("errors_total", "counter"),
+            ("bytes_total", "counter"),
+            ("retries_total", "counter"),
+            ("throttles_total", "counter"),
+            ("session_duration_seconds", "gauge"),
+            ("session_start_time_seconds", "gauge"),
+    ):
+        help_line = next(line for line in lines if line.startswith(f"# HELP ctube_{name} "))
+        # TYPE follows HELP, before any sample of the metric.
+        assert lines[lines.index(help_line) + 1] == f"# TYPE ctube_{name} {kind}"
+
+    assert 'ctube_stage_duration_seconds{stage="transfer",quantile="0.5"} 2.0' in lines
+    assert 'ctube_stage_duration_seconds{stage="transfer",quantile="0.95"} 3.0' in lines
+    assert 'ctube_stage_duration_seconds_sum{stage="transfer"} 6.0' in lines
+    assert 'ctube_stage_duration_seconds_count{stage="transfer"} 3' in lines
+    assert 'ctube_stage_duration_seconds_count{stage="odd \\"stage\\""} 1' in lines
+    assert 'ctube_tracks_total{status="ok"} 1' in lines
+    assert 'ctube_tracks_total{status="failed"} 1' in lines
+    assert 'ctube_errors_total{class="Throttled\\"By\\\\Host"} 1' in lines
+    assert "ctube_bytes_total 600" in lines
+    assert "ctube_retries_total 1" in lines
+    assert "ctube_throttles_total 2" in lines
+
+
+def test_textfile_is_replaced_atomically(monkeypatch, tmp_path):
+    filepath = str(tmp_path / "ctube.prom")
+    replaced = []
+
+    def replace(src, dst):
+        # The complete file is written before it takes the place of dst.
+        with open(src) as file:
+            replaced.append((src, dst, file.read()))
+        return os_replace(src, dst)
+
+    os_replace = metrics.os.replace
+    monkeypatch.setattr(metrics.os, "replace", replace)
+    _metrics().write_prometheus(filepath)
+    with open(filepath) as file:
+        assert replaced == [(f"{filepath}.tmp", filepath, file.read())]
+
+
+def test_stages_recorded_in_workers_are_collected():
+    metrics.collect_stages()
+    with metrics.record_stage("tag"):
+        pass
+    stages = metrics.collect_stages()
+    assert [name for name, _ in stages] == ["tag"]
+    assert metrics.collect_stages() == []
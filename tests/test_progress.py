@@ -0,0 +1,60 @@
+import io
+import time
+import threading
+
+from ctube.containers import Album, Song
+from ctube.progress import ProgressRenderer
+
+
+ALBUM = Album("Album", "Album", 2024, "", "PL1")
+
+
+class BlockingStream(io.StringIO):
+    """A terminal that blocks every write until it is released."""
+
+    def __init__(self):
+        super().__init__()
+        self.writing = threading.Event()
+        self.released = threading.Event()
+
+    def write(self, string):
+        self.writing.set()
+        self.released.wait()
+        return super().write(string)
+
+
+def test_updates_are_not_blocked_by_the_stream():
+    stream = BlockingStream()
+    renderer = ProgressRenderer(fps=100, stream=stream, interactive=True)
+    song = Song("Track", "Artist", 1, b"", "Track.mp3", ALBUM, video_id="v1")
+    renderer.start()
+    renderer.update(song, 4096, 0)
+    renderer.update(song, 4096, 1024)
+    assert stream.writing.wait(5)
+    # The renderer thread is stuck writing a frame.
+    updated = threading.Thread(target=renderer.update, args=(song, 4096, 2048))
+    updated.start()
+    updated.join(1)
+    blocked = updated.is_alive()
+    stream.released.set()
+    assert not blocked
+    renderer.update(song, 4096, 4096)
+    renderer.stop()
+    assert ":: Received 4.0 KB" in stream.getvalue()
+
+
+def test_log_lines_without_a_terminal():
+    stream = io.StringIO()
+    renderer = ProgressRenderer(stream=stream, interactive=False, log_interval=0.01)
+    song = Song("Track", "Artist", 1, b"", "Track.mp3", ALBUM, video_id="v1")
+    with renderer:
+        renderer.update(song, 4096, 0)
+        renderer.update(song, 4096, 1024)
+        deadline = time.monotonic() + 5
+        while ":: 1 active, 0 done | 1.0 KB" not in stream.getvalue():
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        renderer.update(song, 4096, 4096)
+    output = stream.getvalue()
+    assert "\033[2K" not in output  # no cursor movement
+    assert ":: Received 4.0 KB" in output.splitlines()[-1]
@@ -0,0 +1,101 @@
+import os
+import re
+import sys
+import time
+import select
+import subprocess
+import tempfile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets can be relaxed on slow machines through the environment.
+IMPORT_BUDGET_MS = float(os.environ.get("CTUBE_IMPORT_BUDGET_MS", 150))
+PROMPT_BUDGET_MS = float(os.environ.get("CTUBE_PROMPT_BUDGET_MS", 1500))
+RUNS = 5
+
+HEAVY_MODULES = (
+    "pydub",
+    "mutagen",
+    "pytubefix",
+    "innertube",
+    "httpx",
+    "requests",
+)
+
+
+def _run_python(code: str, env=None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+
+def _cumulative_import_ms(stderr: str, module: str) -> float:
+    # -X importtime lines: "import time: <self us> | <cumulative us> | <module>"
+    pattern = re.compile(rf"import time:\s+\d+ \|\s+(\d+) \|\s*{re.escape(module)}$")
+    for line in stderr.splitlines():
+        match = pattern.match(line)
+        if match:
+            return int(match.group(1)) / 1000
+    raise AssertionError(f"{module} not found in -X importtime output")
+
+
+def _time_to_prompt_ms(home: str) -> float:
+    env = {**os.environ, "HOME": home, "XDG_CACHE_HOME": os.path.join(home, ".cache")}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", "from ctube.cli import main; main()"],
+        cwd=ROOT,
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+    assert process.stdin is not None and process.stdout is not None
+    output = b""
+    try:
+        deadline = start + 30
+        while "❯".encode() not in output:
+            assert time.perf_counter() < deadline, "prompt never appeared"
+            ready, _, _ = select.select([process.stdout], [], [], 0.01)
+            if ready:
+                chunk = os.read(process.stdout.fileno(), 4096)
+                assert chunk, "ctube exited before showing the prompt"
+                output += chunk
+        elapsed = (time.perf_counter() - start) * 1000
+        process.stdin.write(b"exit\n")
+        process.stdin.flush()
+        process.wait(timeout=10)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return elapsed
+
+
+def test_cli_import_does_not_load_heavy_dependencies():
+    code = (
+        "import sys, ctube.cli; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    assert _run_python(code).stdout.strip() == ""
+
+
+def test_cli_import_time():
+    best = min(
+        _cumulative_import_ms(_run_python("import ctube.cli").stderr, "ctube.cli")
+        for _ in range(RUNS)
+    )
+    print(f"import ctube.cli: {best:.1f} ms")
+    assert best < IMPORT_BUDGET_MS
+
+
+def test_time_to_prompt():
+    with tempfile.TemporaryDirectory() as home:
+        best = min(_time_to_prompt_ms(home) for _ in range(RUNS))
+    print(f"time to prompt: {best:.1f} ms")
+    assert best < PROMPT_BUDGET_MS
@@ -0,0 +1,68 @@
+from concurrent.futures import Future
+
+import pytest
+
+from ctube.callbacks import on_complete_callback
+from ctube.containers import Album, Song, Stage
+from ctube.download import Downloader
+from ctube.errors import TaggingError
+from ctube.formats import OutputFormat, OutputProfile
+from ctube.transcode import Transcoder
+
+
+ALBUM = Album(
+    title="Album",
+    album_type="Album",
+    release_year=2020,
+    thumbnail_url="",
+    playlist_id="PL0"
+)
+
+
+def test_failing_on_stages_still_resolves_the_future():
+    def on_stages(song, stages):
+        raise RuntimeError("metrics")
+
+    transcoder = Transcoder(func=str, max_workers=1, on_stages=on_stages)
+    transcoder._slots.acquire()  # taken by submit
+    inner, future = Future(), Future()
+    inner.set_result(("Track.mp3", [("transcode", 1.0)]))
+    with pytest.raises(RuntimeError):
+        transcoder._on_done(None, inner, future)
+    assert future.result(timeout=0) == "Track.mp3"
+
+
+@pytest.mark.parametrize("output_format", [OutputFormat.M4A, OutputFormat.OPUS])
+def test_tagging_errors_are_ctube_errors(tmp_path, output_format):
+    filepath = str(tmp_path / f"Track.{output_format.value}")
+    with open(filepath, "wb") as file:
+        file.write(b"not audio")
+    song = Song(
+        title="Track",
+        artist="Artist",
+        track_num=1,
+        image_data=b"",
+        filepath=filepath,  # already encoded, only tagged
+        album=ALBUM,
+        output_format=output_format,
+        outputs=[(filepath, OutputProfile(output_format))]
+    )
+    with pytest.raises(TaggingError):
+        on_complete_callback(song)
+
+
+def test_tagging_errors_fail_one_track(tmp_path):
+    downloader = Downloader(
+        output_path=str(tmp_path),
+        on_complete_callback=on_complete_callback,
+        on_progress_callback=lambda song, filesize, received: None,
+        client=object()
+    )
+    song = Song("Track", "Artist", 1, b"", str(tmp_path / "Track.m4a"), ALBUM)
+    future = Future()
+    future.set_exception(TaggingError("Track.m4a: not a MP4 file"))
+    try:
+        _, stage, error = downloader.get_transcode_result(song, future)
+    finally:
+        downloader.close()
+    assert stage == Stage.TRANSCODE and "TaggingError" in error
@@ -0,0 +1,114 @@
+import datetime
+
+import pytest
+
+from ctube import transfer
+from ctube.errors import UnexpectedRange
+from ctube.limits import TokenBucket
+
+
+STREAM = bytes(range(256)) * 16
+
+
+class FakeResponse:
+    def __init__(self, status_code, content, headers):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.elapsed = datetime.timedelta()
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self):
+        self.ranges = []
+
+    def get(self, url, headers, timeout=None):
+        start, end = (int(value) for value in headers["Range"][len("bytes="):].split("-"))
+        self.ranges.append((start, end))
+        return FakeResponse(
+            206,
+            STREAM[start:end + 1],
+            {"Content-Range": f"bytes {start}-{end}/{len(STREAM)}"}
+        )
+
+
+def _patch(monkeypatch, session):
+    delays = []
+    monkeypatch.setattr(transfer, "get_session", lambda: session)
+    monkeypatch.setattr(transfer, "_wait", delays.append)
+    return delays
+
+
+def test_limited_ranges_are_reserved_before_being_requested(monkeypatch):
+    session = FakeSession()
+    delays = _patch(monkeypatch, session)
+    limiter = TokenBucket(rate=1024)
+    data = b"".join(transfer.iter_range("url", 0, len(STREAM), chunk_size=len(STREAM), limiter=limiter))
+    assert data == STREAM
+    assert [end - start + 1 for start, end in session.ranges] == [1024] * 4
+    # _wait returns at once here: each delay counts the ranges still owed.
+    assert [round(delay) for delay in delays] == [0, 1, 2, 3]
+
+
+def test_unlimited_ranges_keep_the_chunk_size(monkeypatch):
+    session = FakeSession()
+    _patch(monkeypatch, session)
+    data = b"".join(transfer.iter_range("url", 0, len(STREAM), chunk_size=3000, limiter=TokenBucket()))
+    assert data == STREAM
+    assert session.ranges == [(0, 2999), (3000, len(STREAM) - 1)]
+
+
+class IgnoredRangeSession(FakeSession):
+    def get(self, url, headers, timeout=None):
+        return FakeResponse(200, STREAM, {})
+
+
+class ShiftedRangeSession(FakeSession):
+    def get(self, url, headers, timeout=None):
+        response = super().get(url, headers, timeout)
+        response.headers["Content-Range"] = f"bytes 0-1023/{len(STREAM)}"
+        return response
+
+
+@pytest.mark.parametrize("session", [IgnoredRangeSession(), ShiftedRangeSession()])
+def test_resume_requires_the_requested_range(monkeypatch, tmp_path, session):
+    _patch(monkeypatch, session)
+    filepath = str(tmp_path / "stream")
+    part = transfer.PartFile(filepath, len(STREAM))
+    part.open()
+    part.write(STREAM[:2048])
+    part.close()
+    with pytest.raises(UnexpectedRange):
+        transfer.download("url", filepath, len(STREAM), chunk_size=len(STREAM), on_progress=lambda received: None)
+    with open(f"{filepath}.part", "rb") as file:
+        assert file.read() == STREAM[:2048]
+
+
+def test_chunk_sizes_stay_within_bounds():
+    sizer = transfer.ChunkSizer(initial=1, min_size=1000, max_size=100_000)
+    assert sizer.size == 1000
+    # 10 MB/s: a second of transfer is above max_size.
+    assert sizer.update(100_000, latency=0.0, elapsed=0.01) == 100_000
+    sizer = transfer.ChunkSizer(initial=50_000, min_size=1000, max_size=100_000)
+    # 10 B/s: a second of transfer is below min_size.
+    assert sizer.update(100, latency=0.0, elapsed=10.0) == 1000
+    with pytest.raises(ValueError):
+        transfer.ChunkSizer(min_size=2, max_size=1)
+
+
+def test_chunk_sizes_follow_the_throughput():
+    sizer = transfer.ChunkSizer(initial=10_000, min_size=1000, max_size=1_000_000, smoothing=0.5)
+    assert sizer.update(10_000, latency=0.0, elapsed=1.0) == 10_000
+    # Throughput grows from 10 to 30 KB/s, averaged to 20 KB/s.
+    assert sizer.update(30_000, latency=0.0, elapsed=1.0) == 20_000
+    # Then falls to 2 KB/s: 11 KB/s on average.
+    assert sizer.update(2000, latency=0.0, elapsed=1.0) == 11_000
+
+
+def test_chunk_sizes_outlast_the_latency():
+    sizer = transfer.ChunkSizer(initial=10_000, min_size=1000, max_size=1_000_000)
+    # 10 KB/s with 0.5s latency: requests last 4 round trips, not 1s.
+    assert sizer.update(10_000, latency=0.5, elapsed=1.5) == 20_000